@@ -0,0 +1,387 @@
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from ingest import month_order, read_upload_chunks
+
+# Measures summed into the product x month aggregate cube
+cube_measures = ['SALES', 'QTY_SOLD', 'TOTAL_STOCK', 'ACTUAL_STOCK', 'SYSTEM_STOCK', 'SURPLUS_&_SHORTAGE']
+
+# Measures only used by the stock reconciliation; files without these columns are aggregated without them
+reconciliation_measures = ['SYSTEM_STOCK', 'SURPLUS_&_SHORTAGE']
+
+# Most distinct prices kept while streaming; beyond this the price table is compressed
+# into a quantile sketch of half as many weighted centroids
+price_sketch_size = 4096
+
+# Function to list the cube measures to aggregate given the available columns: every measure,
+# less the reconciliation measures that are missing
+def available_measures(columns):
+    return [measure for measure in cube_measures if measure in columns or measure not in reconciliation_measures]
+
+# Function to check that a dataset has the columns the aggregates are built from: product, month,
+# price and every measure except the optional reconciliation ones. source names the data in the error.
+def check_columns(columns, source=None):
+    required = ['PRODUCT', 'MONTH', 'PRICE_(GHS)'] + available_measures(columns)
+    missing = [col for col in required if col not in columns]
+    if missing:
+        prefix = f"{source}: " if source else ""
+        raise ValueError(f"{prefix}missing columns {', '.join(missing)}")
+
+# Function to fold rows into partial sums for the product x month cells they touch
+def aggregate_rows(df):
+    check_columns(df.columns)
+    cells = df.groupby(['PRODUCT', 'MONTH'], observed=True).agg(
+        **{measure: (measure, 'sum') for measure in available_measures(df.columns)},
+        ROWS=('SALES', 'size')  # Number of source rows, used to tell "no data" from "zero sales"
+    )
+    # Plain product labels, so partial sums from chunks with different categories line up
+    cells.index = cells.index.set_levels(cells.index.levels[0].astype(str), level='PRODUCT')
+    # Price table: total sales and number of priced sales rows per distinct price
+    prices = df.groupby('PRICE_(GHS)').agg(SALES=('SALES', 'sum'), COUNT=('SALES', 'count'))
+    # Row totals per product over every row, including the rows without a product (one missing label)
+    # or without a recognized month that the cube leaves out; the headline numbers come from these
+    totals = df.groupby(df['PRODUCT'].astype(object), dropna=False).agg(
+        SALES=('SALES', 'sum'), QTY_SOLD=('QTY_SOLD', 'sum'), ROWS=('SALES', 'size'))
+    return cells, prices, totals
+
+# Function to merge two sets of partial sums
+def merge_aggregates(left, right):
+    cells = pd.concat([left[0], right[0]]).groupby(level=['PRODUCT', 'MONTH'], observed=True).sum()
+    prices = pd.concat([left[1], right[1]]).groupby(level='PRICE_(GHS)').sum()
+    totals = pd.concat([left[2], right[2]]).groupby(level='PRODUCT', dropna=False).sum()
+    return cells, prices, totals
+
+# Function to expand partial sums into the dense cube and the totals rolled up from it, plus the
+# price table and the row totals per product
+def finish_aggregates(partial):
+    cells, prices, totals = partial
+
+    # Dense grid: every product appears once per month, empty cells are 0. Rows are product-major
+    # in month_order, so the cells of the product with category code c are rows 12c to 12c + 11.
+    products = cells.index.get_level_values('PRODUCT').unique().sort_values()
+    months = pd.CategoricalIndex(month_order, categories=month_order, ordered=True)
+    grid = pd.MultiIndex.from_product([products, months], names=['PRODUCT', 'MONTH'])
+    cube = cells.reindex(grid, fill_value=0).reset_index()
+    cube['PRODUCT'] = pd.Categorical(cube['PRODUCT'], categories=products)
+
+    # Product and month totals are rolled up from the cube, not from the rows
+    measures = available_measures(cells.columns)
+    by_product = cube.groupby('PRODUCT', observed=True)[measures + ['ROWS']].sum().reset_index()
+    by_product = by_product[by_product['ROWS'] > 0]
+    by_month = cube.groupby('MONTH', observed=False)[measures + ['ROWS']].sum().reset_index()
+    return cube, by_product, by_month, prices.reset_index(), totals.reset_index()
+
+# Function to slice the cube rows of some products by their category codes (no column scan)
+def product_cells(cube, products):
+    codes = cube['PRODUCT'].cat.categories.get_indexer(products)
+    codes = codes[codes >= 0]
+    months = len(month_order)
+    return cube.iloc[(codes[:, None] * months + np.arange(months)).ravel()]
+
+# Function to index the rows of a frame by product: row positions sorted by product code and
+# the offset where each code's rows start, so one product's rows are a single slice
+def product_index(df):
+    codes = df['PRODUCT'].cat.codes.to_numpy()
+    order = np.argsort(codes, kind='stable')  # Missing products (code -1) sort first
+    counts = np.bincount(codes[codes >= 0], minlength=len(df['PRODUCT'].cat.categories))
+    offsets = np.concatenate([[0], np.cumsum(counts)]) + np.count_nonzero(codes < 0)
+    return order.astype('int32' if len(df) < 2 ** 31 else 'int64'), offsets
+
+# Function to look up the rows of one product with a product index
+def product_rows(df, index, product):
+    order, offsets = index
+    code = df['PRODUCT'].cat.categories.get_indexer([product])[0]
+    if code < 0:
+        return df.iloc[:0]
+    return df.iloc[order[offsets[code]:offsets[code + 1]]]
+
+# Function to reconcile counted against system stock per cube cell. DISCREPANCY is
+# ACTUAL_STOCK - SYSTEM_STOCK; UNEXPLAINED is what the recorded surplus/shortage does not cover.
+# Returns None when the data has no system stock or surplus/shortage columns.
+def stock_reconciliation(cells):
+    if not set(reconciliation_measures) <= set(cells.columns):
+        return None
+    reconciliation = cells.loc[cells['ROWS'] > 0, ['PRODUCT', 'MONTH', 'ACTUAL_STOCK', 'SYSTEM_STOCK',
+                                                   'SURPLUS_&_SHORTAGE']]
+    # Widen small integer columns so the differences cannot overflow
+    reconciliation = reconciliation.astype({col: 'int64' for col in reconciliation.columns[2:]
+                                            if pd.api.types.is_integer_dtype(reconciliation[col])})
+    reconciliation['DISCREPANCY'] = reconciliation['ACTUAL_STOCK'] - reconciliation['SYSTEM_STOCK']
+    reconciliation['UNEXPLAINED'] = reconciliation['DISCREPANCY'] - reconciliation['SURPLUS_&_SHORTAGE']
+    return reconciliation
+
+# Function to check that a delta (newly uploaded rows) can be appended to existing aggregates:
+# it needs every column aggregated into the existing dataset and may only add months that have no rows yet
+def validate_delta(delta, by_month):
+    required = ['PRODUCT', 'MONTH', 'PRICE_(GHS)'] + available_measures(by_month.columns)
+    missing = [col for col in required if col not in delta.columns]
+    if missing:
+        raise ValueError(f"missing columns {', '.join(missing)}")
+    if delta['MONTH'].isna().any():
+        raise ValueError("rows without a recognized month")
+
+    present = set(by_month.loc[by_month['ROWS'] > 0, 'MONTH'])
+    overlap = [month for month in delta['MONTH'].unique() if month in present]
+    if overlap:
+        raise ValueError(f"{', '.join(map(str, sorted(overlap, key=month_order.index)))} already in the dataset")
+
+# Function to append a delta to finished aggregates. Only the cube's non-empty cells are merged
+# with the delta's partial sums, so the cost follows the delta and the product count, not the
+# number of rows behind the existing aggregates. Measures the existing dataset lacks are not added.
+def append_aggregates(aggregates, delta):
+    cube, _, _, prices, row_totals = aggregates
+    cells = cube[cube['ROWS'] > 0].astype({'PRODUCT': str}).set_index(['PRODUCT', 'MONTH'])
+    partial = (cells, prices.set_index('PRICE_(GHS)'), row_totals.set_index('PRODUCT'))
+    delta_cells, delta_prices, delta_totals = aggregate_rows(delta)
+    return finish_aggregates(merge_aggregates(partial, (delta_cells[cells.columns], delta_prices, delta_totals)))
+
+# Function to build the aggregates by streaming CSV files or workbooks (binary file objects) in chunks,
+# so the raw rows never have to fit in memory. progress is called with the fraction read so far.
+def stream_csv_aggregates(files, chunk_rows, progress=None):
+    sizes = []
+    for file in files:
+        file.seek(0, 2)
+        sizes.append(file.tell())
+    total_size = max(sum(sizes), 1)
+    done_size = 0
+
+    partial = None
+    for file, size in zip(files, sizes):
+        for chunk in read_upload_chunks(file, chunk_rows):
+            check_columns(chunk.columns, getattr(file, 'name', None))
+            chunk_partial = aggregate_rows(chunk)
+            partial = chunk_partial if partial is None else merge_aggregates(partial, chunk_partial)
+            if len(partial[1]) > price_sketch_size:
+                partial = (partial[0], compress_prices(partial[1], price_sketch_size // 2), partial[2])
+            if progress is not None:
+                progress(min((done_size + file.tell()) / total_size, 1.0))
+        done_size += size
+    return finish_aggregates(partial)
+
+# Function to calculate the headline numbers shown on the KPI cards. Totals, product count and
+# top product cover every row; rows_outside_cube counts the rows the cube (and the charts) leave out.
+def key_metrics(row_totals, by_month):
+    named = row_totals[row_totals['PRODUCT'].notna()]
+    top_product_row = named.loc[named['SALES'].idxmax()]
+    top_month_row = by_month.loc[by_month['SALES'].idxmax()]
+    return {
+        'total_sales': row_totals['SALES'].sum(),
+        'total_units_sold': row_totals['QTY_SOLD'].sum(),
+        'total_products': len(named),
+        'top_product': top_product_row['PRODUCT'],
+        'top_product_sales': top_product_row['SALES'],
+        'top_month': top_month_row['MONTH'],  # Month with the highest sales
+        'top_month_sales': top_month_row['SALES'],
+        'rows_outside_cube': row_totals['ROWS'].sum() - by_month['ROWS'].sum(),
+    }
+
+# Function to compress a price table (indexed by price) into at most size centroids. Centroids
+# never span more than one of size // 2 - 1 steps of cumulative row count, nor of the price range,
+# so quantiles and equal-width bins both stay accurate to within one centroid. Each keeps the summed
+# SALES and COUNT of its prices at their COUNT-weighted mean price. The lowest and highest prices
+# keep centroids of their own, so the price range (and the equal-width bin edges) stay exact.
+def compress_prices(prices, size):
+    if len(prices) <= size:
+        return prices
+    price = prices.index.to_numpy(dtype='float64')
+    count = prices['COUNT'].to_numpy(dtype='float64')
+    order = np.argsort(price)
+    price, count, sales = price[order], count[order], prices['SALES'].to_numpy(dtype='float64')[order]
+
+    # Centroid per price from its step of cumulative row count and its step of price. Both grow
+    # with the price, so the pairs in use number at most 2 * steps - 1.
+    steps = size // 2 - 1
+    rank = np.cumsum(count) - count / 2
+    by_rank = np.minimum((rank / max(count.sum(), 1) * steps).astype('int64'), steps - 1)
+    by_price = np.minimum(((price - price[0]) / (price[-1] - price[0]) * steps).astype('int64'), steps - 1)
+    group = by_rank * steps + by_price
+    group[0], group[-1] = -1, steps * steps  # The end prices are their own centroids
+    group = np.unique(group, return_inverse=True)[1]
+
+    weight = np.bincount(group, weights=count)
+    centroid = np.bincount(group, weights=price * count) / np.where(weight > 0, weight, 1)
+    unweighted = np.bincount(group, weights=price) / np.bincount(group)
+    compressed = pd.DataFrame({
+        'SALES': np.bincount(group, weights=sales),
+        'COUNT': weight.astype('int64'),
+    }, index=pd.Index(np.where(weight > 0, centroid, unweighted), name='PRICE_(GHS)'))
+    return compressed.groupby(level='PRICE_(GHS)').sum()
+
+# Function to compute the bin edges over the price table: equal-width ranges between the
+# lowest and highest price, or quantile ranges holding about the same number of sales rows
+def price_bin_edges(price_sales, bins=10, method='width'):
+    price = price_sales['PRICE_(GHS)'].to_numpy(dtype='float64')
+    low, high = price.min(), price.max()
+    if method == 'quantile':
+        order = np.argsort(price)
+        count = price_sales['COUNT'].to_numpy(dtype='float64')[order]
+        if count.sum() == 0:
+            count = np.ones_like(count)
+        cumulative = np.cumsum(count) / count.sum()
+        inner = price[order][np.searchsorted(cumulative, np.linspace(0, 1, bins + 1)[1:-1])]
+        return np.unique(np.concatenate([[low], inner, [high]]))
+
+    # A single price gets a small range around it, as pd.cut does
+    if low == high:
+        pad = 0.001 * abs(low) if low != 0 else 0.001
+        low, high = low - pad, high + pad
+    return np.linspace(low, high, bins + 1)
+
+# Function to bin the price table (one row per distinct price) into price ranges with the
+# average sales per row in each range. Bins are right-closed, the first one includes the
+# lowest price; PRICE_MID is the bin midpoint used for the trend fit.
+def price_sales_bins(price_sales, bins=10, method='width'):
+    edges = price_bin_edges(price_sales, bins, method)
+    price = price_sales['PRICE_(GHS)'].to_numpy(dtype='float64')
+    bin_index = np.searchsorted(edges[1:-1], price, side='left')
+    n = len(edges) - 1
+
+    sales = np.bincount(bin_index, weights=price_sales['SALES'].to_numpy(dtype='float64'), minlength=n)
+    count = np.bincount(bin_index, weights=price_sales['COUNT'].to_numpy(dtype='float64'), minlength=n)
+    price_sales_agg = pd.DataFrame({
+        'PRICE_LOW': edges[:-1],
+        'PRICE_HIGH': edges[1:],
+        'PRICE_MID': (edges[:-1] + edges[1:]) / 2,
+        'SALES': sales / np.where(count > 0, count, np.nan),
+        'COUNT': count.astype('int64'),
+    })
+
+    # Create descriptive labels for the bins
+    price_sales_agg['PRICE_LABEL'] = [f"{low:.2f} - {high:.2f}" for low, high in zip(edges[:-1], edges[1:])]
+    return price_sales_agg
+
+# Function to fit a least-squares line of average sales against the bin midpoints.
+# Returns (slope, intercept), or NaNs when fewer than two bins have sales.
+def price_trend(price_bins):
+    fitted = price_bins[price_bins['COUNT'] > 0]
+    if len(fitted) < 2:
+        return np.nan, np.nan
+    slope, intercept = np.polyfit(fitted['PRICE_MID'], fitted['SALES'], 1)
+    return slope, intercept
+
+# Function to build the per-product stock table, sorted by TOTAL_STOCK in descending order
+def summarize_stock(by_product):
+    stock_analysis = by_product[['PRODUCT', 'TOTAL_STOCK', 'ACTUAL_STOCK', 'SALES']]
+    return stock_analysis.sort_values(by='TOTAL_STOCK', ascending=False)
+
+# Function to precompute product x month matrices of sales and row counts for ABC.
+# Columns follow month_order, so any month selection is a column mask and a row sum.
+def month_matrices(cube):
+    sales = cube.pivot(index='PRODUCT', columns='MONTH', values='SALES').reindex(columns=month_order)
+    rows = cube.pivot(index='PRODUCT', columns='MONTH', values='ROWS').reindex(columns=month_order)
+    return sales.index.to_numpy(), sales.to_numpy(dtype='float64'), rows.to_numpy(dtype='int64')
+
+# Function to precompute the product x month matrices the demand forecast works from:
+# quantity sold, actual (counted) stock and row counts, columns in month_order
+def demand_matrices(cube):
+    pivot = cube.pivot(index='PRODUCT', columns='MONTH', values=['QTY_SOLD', 'ACTUAL_STOCK', 'ROWS'])
+    return (pivot.index.to_numpy(),
+            pivot['QTY_SOLD'].reindex(columns=month_order).to_numpy(dtype='float64'),
+            pivot['ACTUAL_STOCK'].reindex(columns=month_order).to_numpy(dtype='float64'),
+            pivot['ROWS'].reindex(columns=month_order).to_numpy(dtype='int64'))
+
+# Function to forecast next month's demand for every product at once from a product x month
+# quantity matrix (months in order, oldest first). 'moving_average' averages the last window
+# months; 'exponential' runs simple exponential smoothing, one vectorized step per month.
+# season, if given, holds one multiplicative index per history month plus one for the month
+# forecast: the history is deseasonalized before fitting and the forecast reseasonalized.
+# Returns the forecasts and the standard deviation of the one-step-ahead errors per product.
+def forecast_matrix(history, method='exponential', window=3, alpha=0.3, season=None):
+    if season is not None:
+        history = history / season[:-1]
+
+    # One-step-ahead forecasts for months 2..T, so the errors measure the model, not the data
+    fitted = np.empty_like(history)
+    if method == 'moving_average':
+        cumulative = np.cumsum(np.pad(history, ((0, 0), (1, 0))), axis=1)
+        counts = np.minimum(np.arange(1, history.shape[1] + 1), window)
+        forecasts = (cumulative[:, 1:] - cumulative[:, np.arange(1, history.shape[1] + 1) - counts]) / counts
+        fitted[:, 1:], forecast = forecasts[:, :-1], forecasts[:, -1]
+    else:
+        level = history[:, 0].copy()
+        for month in range(1, history.shape[1]):
+            fitted[:, month] = level
+            level = alpha * history[:, month] + (1 - alpha) * level
+        forecast = level
+    errors = history[:, 1:] - fitted[:, 1:]
+    error_std = np.sqrt((errors ** 2).mean(axis=1)) if errors.shape[1] else np.zeros(len(history))
+
+    if season is not None:
+        forecast, error_std = forecast * season[-1], error_std * season[-1]
+    return forecast, error_std
+
+# Function to forecast demand and compute days of cover and reorder points for every product.
+# The history runs from the first to the last month with data; a product's stock is its
+# ACTUAL_STOCK in the last month it has rows. The safety stock covers demand variability over
+# the lead time at the given service level (normal approximation).
+def forecast_demand(matrices, method='exponential', window=3, alpha=0.3, seasonal=False,
+                    lead_time_days=14, service_level=0.95):
+    products, quantity, stock, rows = matrices
+    active = np.flatnonzero((rows > 0).any(axis=0))
+    first, last = active[0], active[-1]
+    history = quantity[:, first:last + 1]
+
+    season = None
+    if seasonal:
+        # Pooled seasonal profile: each month's share of total demand against the average month.
+        # With a single year of data, next month's index is that month's value from this year.
+        totals = quantity.sum(axis=0)
+        index = np.where(rows.any(axis=0) & (totals > 0), totals / totals[active].mean(), 1.0)
+        season = np.append(index[first:last + 1], index[(last + 1) % len(month_order)])
+    forecast, error_std = forecast_matrix(history, method, window, alpha, season)
+
+    # Stock in each product's last month with data
+    has_rows = rows > 0
+    last_month = len(month_order) - 1 - np.argmax(has_rows[:, ::-1], axis=1)
+    actual_stock = stock[np.arange(len(products)), last_month]
+
+    days_per_month = 365 / 12
+    daily_demand = np.maximum(forecast, 0) / days_per_month
+    z = NormalDist().inv_cdf(service_level)
+    safety_stock = z * error_std * np.sqrt(lead_time_days / days_per_month)
+    reorder_point = daily_demand * lead_time_days + safety_stock
+
+    forecast_data = pd.DataFrame({
+        'PRODUCT': products,
+        'ACTUAL_STOCK': actual_stock,
+        'FORECAST_QTY': forecast,
+        'DAILY_DEMAND': daily_demand,
+        'DAYS_OF_COVER': np.maximum(actual_stock, 0) / np.where(daily_demand > 0, daily_demand, np.nan),
+        'SAFETY_STOCK': safety_stock,
+        'REORDER_POINT': reorder_point,
+        'REORDER': actual_stock <= reorder_point,
+    })
+    # Products that have rows in the history, most urgent first
+    forecast_data = forecast_data[has_rows.any(axis=1)]
+    return forecast_data.sort_values('DAYS_OF_COVER', na_position='last')
+
+# Function to classify products into A, B and C by cumulative share of sales.
+# present marks the products that have rows in the selection; the others are left out.
+def classify_abc(products, sales, present, a_threshold=20, b_threshold=50):
+    abc_data = pd.DataFrame({'PRODUCT': products[present], 'SALES': sales[present]})
+    abc_data = abc_data.sort_values(by='SALES', ascending=False)
+    abc_data['CUMULATIVE_SALES'] = abc_data['SALES'].cumsum()
+    abc_data['CUMULATIVE_PERCENTAGE'] = 100 * abc_data['CUMULATIVE_SALES'] / abc_data['SALES'].sum()
+    cumulative = abc_data['CUMULATIVE_PERCENTAGE'].to_numpy()
+    abc_data['CATEGORY'] = np.select([cumulative <= a_threshold, cumulative <= b_threshold], ['A', 'B'], 'C')
+    return abc_data
+
+# Function to run the ABC classification for a selection of months from the month matrices
+def abc_for_months(matrices, months, a_threshold=20, b_threshold=50):
+    products, month_sales, month_rows = matrices
+    month_mask = np.isin(month_order, months)
+    return classify_abc(
+        products,
+        month_sales[:, month_mask].sum(axis=1),
+        month_rows[:, month_mask].sum(axis=1) > 0,
+        a_threshold,
+        b_threshold
+    )
+
+# Function to total the sales and share of sales per ABC category
+def summarize_abc(abc_data):
+    abc_summary = abc_data.groupby('CATEGORY')['SALES'].sum().reset_index()
+    abc_summary['PERCENTAGE'] = 100 * abc_summary['SALES'] / abc_summary['SALES'].sum()
+    return abc_summary
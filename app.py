@@ -1,6 +1,42 @@
+import functools
+import hashlib
+import inspect
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
 import streamlit as st
 import pandas as pd
 import altair as alt
+from streamlit import dataframe_util
+
+from ingest import (month_order, parquet_available, upload_types, is_excel, parse_upload, combine_frames,
+                    read_upload_chunks)
+from dataset_store import DatasetStore
+from export import export_formats, export_chunk_rows, frame_chunks, export_file
+from duckdb_engine import duckdb_available, duckdb_aggregates
+from analytics import (available_measures, aggregate_rows, finish_aggregates, stream_csv_aggregates,
+                       validate_delta, append_aggregates, product_cells, product_index, product_rows,
+                       stock_reconciliation, demand_matrices, forecast_demand, month_matrices, abc_for_months,
+                       summarize_abc, key_metrics, price_sales_bins, price_trend, summarize_stock)
+
+# On-disk dataset cache: one directory of Parquet files per uploaded file content
+cache_dir = Path(os.environ.get('DASHBOARD_CACHE_DIR', '.cache/datasets'))
+cache_max_bytes = int(os.environ.get('DASHBOARD_CACHE_MAX_MB', '2048')) * 1024 * 1024
+
+# In-memory dataset store shared by all sessions: size budget and idle time before an entry expires
+shared_max_bytes = int(os.environ.get('DASHBOARD_SHARED_MAX_MB', '1024')) * 1024 * 1024
+shared_ttl_seconds = int(os.environ.get('DASHBOARD_SHARED_TTL_SECONDS', '3600'))
 
 # Set page configuration to light theme
 st.set_page_config(page_title="Sales Analysis Dashboard", layout="wide", initial_sidebar_state="expanded")
@@ -63,30 +99,900 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-# Function to load data
-@st.cache_data
-def load_data(file):
-    df = pd.read_csv(file)
-    df.columns = df.columns.str.strip().str.replace(' ', '_').str.upper()  # Normalize column names
-    df.replace('', pd.NA, inplace=True)  # Treat empty strings as NaN
+# Performance instrumentation: each timed section of a rerun is appended to the session's log.
+# Only active while the "Performance panel" sidebar option is ticked.
+perf_logger = logging.getLogger('dashboard.perf')
+perf_stack = []  # Records of the sections currently running, innermost last
+perf_log_size = 500
+
+# Function to create the process-wide count of timed sections running in any session. tracemalloc
+# is process-wide, so it runs only while at least one section is timed; a session that goes away
+# with the panel open leaves no tracing behind.
+@st.cache_resource
+def memory_tracing():
+    return {'sections': 0, 'started': False, 'lock': threading.Lock()}
+
+# Function to count a timed section in, starting memory tracing with the first one
+def start_memory_tracing():
+    tracing = memory_tracing()
+    with tracing['lock']:
+        if tracing['sections'] == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            tracing['started'] = True
+        tracing['sections'] += 1
+        tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0]
+
+# Function to count a timed section out, returning the traced peak since it began; tracing stops
+# after the last section (unless it was already running before the first)
+def stop_memory_tracing():
+    tracing = memory_tracing()
+    with tracing['lock']:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracing['sections'] -= 1
+        if tracing['sections'] == 0 and tracing['started']:
+            tracemalloc.stop()
+            tracing['started'] = False
+        return peak
+
+# Function to time a section (wall time, peak traced memory); with cached=True the record
+# also says whether the cached functions called inside hit or missed
+@contextmanager
+def timed(section, cached=False):
+    if not st.session_state.get('perf_enabled'):
+        yield {}
+        return
+    record = {'run': st.session_state.get('perf_run', 0), 'section': section, 'cache': 'hit' if cached else None}
+    perf_stack.append(record)
+    start_memory = start_memory_tracing()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        perf_stack.pop()
+        record['seconds'] = round(time.perf_counter() - start, 4)
+        record['peak_mb'] = round((stop_memory_tracing() - start_memory) / 1e6, 2)
+        perf_log = st.session_state.setdefault('perf_log', [])
+        perf_log.append(record)
+        del perf_log[:-perf_log_size]  # Keep only the most recent records
+        perf_logger.info(json.dumps(record))
+
+# Decorator for st.cache_data that marks the enclosing timed section as a cache miss
+# when the function body actually runs; options (e.g. max_entries) are passed to st.cache_data
+def tracked_cache_data(func=None, **options):
+    if func is None:
+        return functools.partial(tracked_cache_data, **options)
+
+    @functools.wraps(func)
+    def body(*args, **kwargs):
+        if perf_stack:
+            perf_stack[-1]['cache'] = 'miss'
+        return func(*args, **kwargs)
+    return st.cache_data(body, **options)
+
+# Function to create the process-wide dataset store (one per server, not per session)
+@st.cache_resource
+def dataset_store():
+    return DatasetStore(shared_max_bytes, shared_ttl_seconds)
+
+# Decorator that keeps the result in the shared dataset store instead of st.cache_data, so
+# every session gets the same object rather than its own copy. The key is the function name
+# and its arguments, minus the underscore ones; a miss is marked like tracked_cache_data.
+def shared_dataset(func):
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        arguments = signature.bind(*args, **kwargs).arguments
+        key = (func.__name__,) + tuple(value for name, value in arguments.items() if not name.startswith('_'))
+
+        def build():
+            if perf_stack:
+                perf_stack[-1]['cache'] = 'miss'
+            return func(*args, **kwargs)
+        return dataset_store().get_or_build(key, build)
+    return wrapper
+
+# Most chart specs kept in the cache; each holds one chart's encoding and its data as Arrow
+chart_cache_entries = 256
+
+# Function to create the lock held while a chart is converted. Altair's theme and data transformer are
+# process-wide settings shared by every session, and this script's globals are recreated on each rerun,
+# so the lock lives in the resource cache.
+@st.cache_resource
+def chart_lock():
+    return threading.Lock()
+
+# Function to serialize a chart's data frames to Arrow (as Streamlit sends them) instead of Altair's JSON rows.
+# A frame shared by several layers is stored once.
+def arrow_datasets(data, datasets):
+    name = f"data-{id(data)}"
+    if name not in datasets:
+        datasets[name] = dataframe_util.convert_anything_to_arrow_bytes(data)
+    return {'name': name}
+
+# Function to fingerprint a chart: its builder, the content and types of its frames, and its options
+def chart_fingerprint(build, frames, options):
+    digest = hashlib.sha256(f"{build.__qualname__}|{sorted(options.items())!r}".encode())
+    for frame in frames:
+        digest.update(repr([(col, str(dtype)) for col, dtype in frame.dtypes.items()]).encode())
+        digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+# Function to build and serialize a chart's Vega-Lite spec, cached by fingerprint so an unchanged
+# chart skips Altair's construction, validation and serialization on reruns
+@tracked_cache_data(max_entries=chart_cache_entries)
+def chart_spec(_build, fingerprint):
+    chart = _build()
+    datasets = {}
+    with chart_lock():
+        alt.data_transformers.register('arrow_datasets', arrow_datasets)
+        # The default theme's fixed width and height do not apply in Streamlit (as in st.altair_chart)
+        theme = alt.theme.enable('none') if alt.theme.active == 'default' else nullcontext()
+        with theme, alt.data_transformers.enable('arrow_datasets', datasets=datasets):
+            spec = chart.to_dict()
+    spec['datasets'] = datasets
+    return spec
+
+# Function to display a chart built by build(*frames, **options), which returns an Altair chart and
+# only runs when the frames' content or the options change. Records the spec size when instrumented.
+def show_chart(name, build, *frames, **options):
+    with timed(f"chart: {name}", cached=True) as record:
+        spec = chart_spec(functools.partial(build, *frames, **options), chart_fingerprint(build, frames, options))
+        st.vega_lite_chart(spec=spec, use_container_width=True)
+        if st.session_state.get('perf_enabled'):
+            data_bytes = sum(len(data) for data in spec['datasets'].values())
+            encoding = {key: value for key, value in spec.items() if key != 'datasets'}
+            record['payload_kb'] = round((data_bytes + len(json.dumps(encoding))) / 1024, 1)
+
+# Function to hash the content of an uploaded file (cached per upload)
+@tracked_cache_data
+def file_digest(_file, file_id):
+    digest = hashlib.sha256()
+    _file.seek(0)
+    for block in iter(lambda: _file.read(1024 * 1024), b''):
+        digest.update(block)
+    _file.seek(0)
+    return digest.hexdigest()
+
+# Function to hash a set of uploaded files; the upload order does not matter
+def dataset_digest(files):
+    digests = sorted(file_digest(file, file.file_id) for file in files)
+    if len(digests) == 1:
+        return digests[0]
+    return hashlib.sha256(''.join(digests).encode()).hexdigest()
+
+# Function to read a frame from the on-disk cache, or None on a miss
+def cache_read(digest, name):
+    if not parquet_available:
+        return None
+    entry = cache_dir / digest
+    try:
+        frame = pd.read_parquet(entry / f'{name}.parquet')
+    except (OSError, ValueError):
+        return None
+    os.utime(entry)  # Mark the entry as recently used
+    return frame
+
+# Function to write a frame to the on-disk cache and keep the cache under its size cap
+def cache_write(digest, name, frame):
+    if not parquet_available:
+        return
+    entry = cache_dir / digest
+    tmp_path = None
+    try:
+        entry.mkdir(parents=True, exist_ok=True)
+        # A temporary file of its own: other sessions or server processes may write the same entry at once
+        with tempfile.NamedTemporaryFile(dir=entry, prefix=f'{name}.', suffix='.tmp', delete=False) as tmp:
+            tmp_path = Path(tmp.name)
+            frame.to_parquet(tmp)
+        os.replace(tmp_path, entry / f'{name}.parquet')  # Readers never see a partial file
+    except (OSError, ValueError):
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+        return
+    evict_cache(keep=digest)
+
+# Function to evict least recently used cache entries until the cache fits its size cap
+def evict_cache(keep=None):
+    entries = []
+    for entry in cache_dir.iterdir():
+        try:
+            size = sum(path.stat().st_size for path in entry.iterdir())
+            entries.append((entry.stat().st_mtime, size, entry))
+        except OSError:  # Not a directory, or removed by another session meanwhile
+            continue
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):  # Oldest first
+        if total_bytes <= cache_max_bytes:
+            break
+        if entry.name != keep:
+            shutil.rmtree(entry, ignore_errors=True)
+            total_bytes -= size
+
+# Function to load data; the shared in-memory store and the disk cache are keyed on the file content
+@shared_dataset
+def load_data(_files, digest):
+    df = cache_read(digest, 'data')
+    if df is not None:
+        return df
+
+    if len(_files) == 1:
+        frames = [parse_upload(_files[0].name, _files[0].getvalue())]
+    else:
+        # Parse and normalize the files concurrently. Threads rather than processes:
+        # the CSV parsers release the GIL, and Streamlit runs this script as __main__,
+        # so spawned worker processes would re-execute the whole dashboard on start-up.
+        workers = min(len(_files), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(parse_upload, [file.name for file in _files], [file.getvalue() for file in _files]))
+
+    df = combine_frames(frames)
+    cache_write(digest, 'data', df)
     return df
 
+# Function to report the memory the typed frame uses against an all-object/64-bit load
+@tracked_cache_data
+def memory_report(_df, digest):
+    typed_bytes = int(_df.memory_usage(deep=True).sum())
+    untyped_bytes = int(_df.index.memory_usage())
+    for col in _df.columns:
+        series = _df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # One pointer per row plus one string object per non-missing row
+            counts = series.value_counts()
+            untyped_bytes += 8 * len(series) + sum(sys.getsizeof(str(value)) * n for value, n in counts.items())
+        elif pd.api.types.is_numeric_dtype(series.dtype):
+            untyped_bytes += 8 * len(series)
+        else:
+            untyped_bytes += int(series.memory_usage(deep=True, index=False))
+    return typed_bytes, untyped_bytes
+
+# Names of the aggregate frames, in the order finish_aggregates returns them
+aggregate_names = ['cube', 'by_product', 'by_month', 'prices', 'row_totals']
+
+# Function to read the aggregates from the on-disk cache, or None on a miss. With sketched=True
+# (streaming engine) a price table sketched while streaming is accepted when there is no exact one.
+def cached_aggregates(digest, sketched=False):
+    frames = [cache_read(digest, name) for name in aggregate_names]
+    if sketched and frames[3] is None:
+        frames[3] = cache_read(digest, 'prices_sketch')
+    if any(frame is None for frame in frames):
+        return None
+    # Entries written before a required measure was added to the cube are rebuilt
+    return tuple(frames) if set(available_measures(())) <= set(frames[0].columns) else None
+
+# Function to write the aggregates to the on-disk cache. A price table that may have been sketched
+# while streaming is kept apart as prices_sketch, so the exact engines never read it.
+def cache_aggregates(digest, aggregates, sketched=False):
+    for name, frame in zip(aggregate_names, aggregates):
+        cache_write(digest, 'prices_sketch' if sketched and name == 'prices' else name, frame)
+
+# Function to build the aggregates shared by every dashboard section.
+# The dataframe argument is not hashed; the cache is keyed on the file content.
+@shared_dataset
+def build_aggregates(_df, digest):
+    aggregates = cached_aggregates(digest)
+    if aggregates is None:
+        aggregates = finish_aggregates(aggregate_rows(_df))
+        cache_aggregates(digest, aggregates)
+    return aggregates
+
+# Function to build the same aggregates by streaming the files in chunks, so the raw
+# rows never have to fit in memory. _progress is called with the fraction read so far.
+@shared_dataset
+def stream_aggregates(_files, digest, chunk_rows, _progress=None):
+    aggregates = cached_aggregates(digest, sketched=True)
+    if aggregates is not None:
+        return aggregates
+
+    aggregates = stream_csv_aggregates(_files, chunk_rows, progress=_progress)
+    cache_aggregates(digest, aggregates, sketched=True)
+    return aggregates
+
+# Function to build the same aggregates with the DuckDB engine. DuckDB reads files, so the
+# uploads are spooled to a temporary directory first; the query then runs out-of-core.
+@shared_dataset
+def sql_aggregates(_files, digest):
+    aggregates = cached_aggregates(digest)
+    if aggregates is not None:
+        return aggregates
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i, file in enumerate(_files):
+            path = Path(tmp) / f'{i}.csv'
+            file.seek(0)
+            with open(path, 'wb') as out:
+                shutil.copyfileobj(file, out)
+            paths.append(path)
+        aggregates = duckdb_aggregates(paths)
+
+    cache_aggregates(digest, aggregates)
+    return aggregates
+
+# Function to append newly uploaded periods to the aggregates of the dataset so far; digest
+# identifies the combined dataset. Only the new files are parsed, the history is not reread.
+# sketched says whether the aggregates came from the streaming engine, whose price table may be a sketch.
+@shared_dataset
+def append_delta(_aggregates, _files, digest, sketched):
+    aggregates = cached_aggregates(digest, sketched)
+    if aggregates is not None:
+        return aggregates
+
+    delta = combine_frames([parse_upload(file.name, file.getvalue()) for file in _files])
+    validate_delta(delta, _aggregates[2])
+    aggregates = append_aggregates(_aggregates, delta)
+    cache_aggregates(digest, aggregates, sketched)
+    return aggregates
+
+# Default settings of the precomputed sections; the widgets start from the same values
+default_price_bins = 10
+default_abc_thresholds = (20, 50)
+
+# Datasets whose precomputed sections are kept
+precompute_entries = 8
+
+# Function to create the worker pool for background section precomputation (one per server)
+@st.cache_resource
+def worker_pool():
+    return ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='precompute')
+
+# Function to bin the prices and fit the trend for the price section
+def price_section(price_sales, bins, method):
+    price_bins = price_sales_bins(price_sales, bins, method)
+    return price_bins, price_trend(price_bins)
+
+# Function to precompute the product x month matrices of sales and row counts for ABC, and classify
+# the default selection. Columns follow month_order, so any other month selection is a column mask and a row sum.
+def abc_section(cube, months):
+    matrices = month_matrices(cube)
+    return matrices, abc_for_months(matrices, months, *default_abc_thresholds)
+
+# Function to start the heavier sections for their default settings in the worker pool, so they
+# compute while the KPI cards and light charts render. The workers only run plain pandas/numpy
+# code (no Streamlit calls); each section waits on its future when it is reached. The futures are
+# kept per dataset (digest) and price table (sketched), so the work runs once per upload for all sessions.
+@st.cache_resource(max_entries=precompute_entries, ttl=shared_ttl_seconds)
+def start_precompute(_cube, _by_product, _by_month, _price_sales, digest, sketched):
+    pool = worker_pool()
+    months = _by_month.loc[_by_month['ROWS'] > 0, 'MONTH'].tolist()
+    return {
+        'stock': pool.submit(summarize_stock, _by_product),
+        'price': pool.submit(price_section, _price_sales, default_price_bins, 'width'),
+        'abc': pool.submit(abc_section, _cube, months),
+    }
+
+# Function to precompute the product x month quantity, stock and row matrices for the forecast
+@tracked_cache_data
+def forecast_matrices(_cube, digest):
+    return demand_matrices(_cube)
+
+# Function to index the loaded rows by product for the drill-down page (shared across sessions)
+@shared_dataset
+def row_index(_df, digest):
+    return product_index(_df)
+
+# Function to drop unused categories; Arrow would otherwise send every product name with each chart
+def compact_categories(frame):
+    return frame.apply(lambda col: col.cat.remove_unused_categories() if isinstance(col.dtype, pd.CategoricalDtype) else col)
+
+# Function to keep the top n rows of a product table by value_col and fold the rest into "Other" rows.
+# sum_cols are summed for the "Other" rows (other columns are left empty); with group_col the
+# remainder is bucketed per group value, e.g. one "Other" bar per ABC category.
+def top_n_with_other(frame, value_col, n, sum_cols=None, label_col='PRODUCT', group_col=None):
+    if len(frame) <= n:
+        return compact_categories(frame)
+    sum_cols = sum_cols or [value_col]
+    ranked = frame.sort_values(by=value_col, ascending=False)
+    top, rest = ranked.iloc[:n], ranked.iloc[n:]
+    top = top.assign(**{label_col: top[label_col].astype(str)})
+
+    if group_col is None:
+        other = rest[sum_cols].sum().to_frame().T
+        other[label_col] = f"Other ({len(rest):,} products)"
+    else:
+        other = rest.groupby(group_col)[sum_cols].sum().reset_index()
+        counts = rest.groupby(group_col).size()
+        other[label_col] = [f"Other {group} ({counts[group]:,} products)" for group in other[group_col]]
+    return pd.concat([top, other], ignore_index=True)
+
+# Function to show a large table one page at a time, so only that page is sent to the browser
+def paged_dataframe(frame, key):
+    pages = max(-(-len(frame) // table_page_size), 1)
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, key=key)
+        st.caption(f"Rows {(page - 1) * table_page_size + 1:,}–{min(page * table_page_size, len(frame)):,} of {len(frame):,}")
+    st.dataframe(frame.iloc[(page - 1) * table_page_size:page * table_page_size])
+
+# Function to render one download button per export format. chunks is called when a button is
+# clicked (on a Streamlit worker thread, without a rerun) and returns the frames to write in order.
+def download_buttons(chunks, name, key):
+    for column, (fmt, (extension, mime)) in zip(st.columns(len(export_formats)), export_formats.items()):
+        def data(fmt=fmt):
+            with export_file(chunks(), fmt) as file:
+                return file.read()
+        column.download_button(f"Download {fmt}", data=data, file_name=f"{name}.{extension}", mime=mime,
+                               key=f"{key}_{fmt.lower()}", on_click="ignore")
+
+# Function to yield the normalized source rows in chunks: slices of the loaded frame, or the
+# uploaded files parsed chunk by chunk when the engine keeps only the aggregates
+def dataset_chunks(df, files):
+    if df is not None:
+        yield from frame_chunks(df)
+        return
+    columns = None
+    for file in files:
+        buffer = io.BytesIO(file.getvalue())
+        buffer.name = file.name  # Tells workbooks from CSV files
+        for chunk in read_upload_chunks(buffer, export_chunk_rows):
+            columns = chunk.columns if columns is None else columns
+            yield chunk.reindex(columns=columns)  # Files may order or lack columns differently
+
+# Sections with their own widgets run as fragments: a widget change reruns only the
+# section that owns it, with the cached aggregates passed in from the last full run.
+
+# Function to build a line chart of one measure per month, one line per product
+def product_month_chart(data, measure, title, axis_title):
+    return alt.Chart(data).mark_line(point=True).encode(
+        x=alt.X('MONTH:O', title='Month', sort=month_order),
+        y=alt.Y(f'{measure}:Q', title=axis_title),
+        color='PRODUCT:N',
+        tooltip=['MONTH', 'PRODUCT', measure]
+    ).properties(title=title)
+
+# Function to build the drill-down chart of sales and quantity per month, one row per measure
+def drilldown_monthly_chart(monthly):
+    return alt.Chart(monthly).mark_line(point=True).encode(
+        x=alt.X('MONTH:O', title='Month', sort=month_order),
+        y=alt.Y('VALUE:Q', title=None),
+        color=alt.Color('MEASURE:N', title=None),
+        row=alt.Row('MEASURE:N', title=None),
+        tooltip=['MONTH', 'MEASURE', 'VALUE']
+    ).properties(height=200).resolve_scale(y='independent')
+
+# Function to build the drill-down chart of actual against system stock per month
+def drilldown_stock_chart(stock):
+    return alt.Chart(stock).mark_bar().encode(
+        x=alt.X('MONTH:O', title='Month', sort=month_order),
+        xOffset='STOCK:N',
+        y=alt.Y('UNITS:Q', title='Units'),
+        color=alt.Color('STOCK:N', title='Stock', scale=alt.Scale(range=['#2575fc', '#ffcc00'])),
+        tooltip=['MONTH', 'STOCK', 'UNITS']
+    ).properties(title="Actual vs. System Stock", height=300)
+
+# Function to build the stock on hand bars with a tick at each product's reorder point
+def reorder_chart(urgent):
+    stock_bars = alt.Chart(urgent).mark_bar(color='#2575fc').encode(
+        x=alt.X('PRODUCT:N', title='Product', sort=None),
+        y=alt.Y('ACTUAL_STOCK:Q', title='Units'),
+        tooltip=['PRODUCT', 'ACTUAL_STOCK', 'REORDER_POINT', 'DAYS_OF_COVER']
+    )
+    reorder_ticks = stock_bars.mark_tick(color='red', thickness=2).encode(y='REORDER_POINT:Q')
+    return (stock_bars + reorder_ticks).properties(title="Stock vs. Reorder Point (lowest days of cover)", height=400)
+
+# Function to build the scatter plot of average sales at the price bin midpoints, with the fitted trend line
+def price_chart(bins, trend=None):
+    scatter_chart = alt.Chart(bins).mark_circle(size=60).encode(
+        x=alt.X('PRICE_MID:Q', title='Price (GHS, bin midpoint)'),
+        y=alt.Y('SALES:Q', title='Average Sales'),
+        tooltip=[alt.Tooltip('PRICE_LABEL', title='Price Range (GHS)'), 'SALES', 'COUNT']
+    ).properties(title="Price vs. Average Sales")
+    if trend is None:
+        return scatter_chart
+    return scatter_chart + alt.Chart(trend).mark_line(color='red').encode(x='PRICE_MID:Q', y='SALES:Q')
+
+# Function to build the bar chart of sales per product coloured by ABC category
+def abc_chart(abc_chart_data):
+    return alt.Chart(abc_chart_data).mark_bar().encode(
+        x=alt.X('PRODUCT:N', title='Product', sort='-y'),
+        y=alt.Y('SALES:Q', title='Sales'),
+        color=alt.Color('CATEGORY:N', title='ABC Category', scale=alt.Scale(domain=['A', 'B', 'C'], range=['#6a11cb', '#2575fc', '#ffcc00'])),  # C color changed to yellow
+        tooltip=['PRODUCT', 'SALES', 'CATEGORY', 'CUMULATIVE_PERCENTAGE']
+    ).properties(
+        title="ABC Classification by Product",
+        width=800,
+        height=400
+    ).configure_mark(
+        opacity=0.8
+    )
+
+# Function to build the bar chart of the top products in category C
+def top_c_chart(top_c_products):
+    return alt.Chart(top_c_products).mark_bar().encode(
+        y=alt.Y('PRODUCT:N', title='Product', sort='-y'),
+        x=alt.X('SALES:Q', title='Sales'),
+        color=alt.value('#ffcc00'),  # Use a distinct color for visibility
+        tooltip=['PRODUCT', 'SALES']
+    ).properties(
+        title="Top 5 Products in Category C",
+        width=400,
+        height=400
+    )
+
+# Function to build the line chart of total sales per month
+def sales_over_time_chart(total_sales_over_time):
+    return alt.Chart(total_sales_over_time).mark_line(point=True).encode(
+        x=alt.X('MONTH:O', title='Month', sort=month_order),
+        y=alt.Y('SALES:Q', title='Total Sales'),
+        tooltip=['MONTH', 'SALES']
+    ).properties(title="Total Sales Over Time")
+
+# Function to build the bar chart of sales per product
+def sales_by_product_chart(sales_by_product):
+    return alt.Chart(sales_by_product).mark_bar().encode(
+        x=alt.X('PRODUCT:O', title='Product', sort='-y'),
+        y=alt.Y('SALES:Q', title='Sales'),
+        tooltip=['PRODUCT', 'SALES']
+    ).properties(title="Sales by Product")
+
+# Function to build the pie chart of the top products' share of sales
+def sales_contribution_chart(top_sales_contribution):
+    return alt.Chart(top_sales_contribution).mark_arc().encode(
+        theta=alt.Theta('SALES:Q', title='Sales'),
+        color=alt.Color('PRODUCT:N', title='Product'),
+        tooltip=['PRODUCT', 'SALES']
+    ).properties(
+        title="Sales Contribution by Top 20 Products",
+        width=400,
+        height=400
+    )
+
+# Function to build the bar chart of total stock per product
+def stock_chart(stock_chart_data):
+    return alt.Chart(stock_chart_data).mark_bar().encode(
+        x=alt.X('PRODUCT:N', title='Product', sort='-y'),
+        y=alt.Y('TOTAL_STOCK:Q', title='Total Stock'),
+        tooltip=['PRODUCT', 'TOTAL_STOCK', 'ACTUAL_STOCK', 'SALES']
+    ).properties(
+        title="Total Stock Analysis",
+        width=800,
+        height=400
+    )
+
+# Function to render the Monthly Sales Trends section
+@st.fragment
+def render_monthly_sales_trends(cube, by_product, chart_top_n):
+    st.subheader("Monthly Sales Trends")
+    monthly_sales_trends = cube[['MONTH', 'PRODUCT', 'SALES']]
+
+    # Get unique products for filtering
+    unique_products = by_product['PRODUCT'].tolist()
+
+    # Create a multiselect widget for product selection
+    selected_products = st.multiselect(
+        "Select Products to Display",
+        options=unique_products,
+        default=unique_products[:2],  # Default to the first two products
+        max_selections=chart_top_n
+    )
+
+    # Slice the selected products' cube rows by category code
+    filtered_monthly_sales_trends = product_cells(monthly_sales_trends, selected_products)
+
+    # Create and display the chart
+    show_chart("monthly sales trends", product_month_chart, compact_categories(filtered_monthly_sales_trends),
+               measure='SALES', title="Monthly Sales Trends", axis_title='Sales')
+
+# Function to render the Monthly Performance Comparison section
+@st.fragment
+def render_performance_comparison(cube, by_product, chart_top_n):
+    st.subheader("Monthly Performance Comparison")
+
+    # Get unique products for filtering
+    unique_products_performance = by_product['PRODUCT'].tolist()
+
+    # Create a multiselect widget for product selection with a unique key
+    selected_products_performance = st.multiselect(
+        "Select Products to Display",
+        options=unique_products_performance,
+        default=unique_products_performance[:2],  # Default to the first two products
+        max_selections=chart_top_n,
+        key="performance_products"
+    )
+
+    # Slice the selected products' cube rows, keeping the months with data and the plotted columns
+    selected_cells = product_cells(cube, selected_products_performance)
+    filtered_monthly_performance = selected_cells.loc[selected_cells['ROWS'] > 0, ['MONTH', 'PRODUCT', 'QTY_SOLD']]
+
+    # Create and display the chart for quantity sold
+    show_chart("monthly performance", product_month_chart, compact_categories(filtered_monthly_performance),
+               measure='QTY_SOLD', title="Monthly Performance Comparison (Quantity Sold)", axis_title='Quantity Sold')
+
+# Function to render the drill-down page for one product: monthly sales and quantity, stock
+# reconciliation and, when the rows are loaded, the product's source rows
+@st.fragment
+def render_product_drilldown(cube, by_product, df, digest):
+    st.title("Product Drill-Down")
+    product = st.selectbox("Product", options=by_product['PRODUCT'].tolist(), key="drilldown_product")
+
+    # The product's 12 cube rows, found by category code
+    with timed("drill-down lookup"):
+        cells = product_cells(cube, [product])
+        reconciliation = stock_reconciliation(cells)
+    months = cells[cells['ROWS'] > 0]
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Sales", f"GHS {months['SALES'].sum():,.2f}")
+    col2.metric("Units Sold", f"{months['QTY_SOLD'].sum():,}")
+    if reconciliation is not None:
+        col3.metric("Unexplained stock difference", f"{reconciliation['UNEXPLAINED'].sum():,}")
+
+    # Sales and quantity per month
+    monthly = months[['MONTH', 'SALES', 'QTY_SOLD']].melt('MONTH', var_name='MEASURE', value_name='VALUE')
+    show_chart("drill-down monthly", drilldown_monthly_chart, monthly)
+
+    # Counted (actual) against system stock per month, when the data has system stock
+    if reconciliation is not None:
+        st.write("### Stock Reconciliation")
+        stock = reconciliation[['MONTH', 'ACTUAL_STOCK', 'SYSTEM_STOCK']].melt('MONTH', var_name='STOCK',
+                                                                              value_name='UNITS')
+        show_chart("drill-down stock", drilldown_stock_chart, stock)
+        st.dataframe(reconciliation.drop(columns='PRODUCT'), hide_index=True)
+        download_buttons(lambda: frame_chunks(reconciliation), "stock_reconciliation", key="download_reconciliation")
+
+    # Source rows, one slice of the prebuilt product index
+    if df is not None:
+        st.write("### Source Rows")
+        with timed("drill-down rows", cached=True):
+            rows = product_rows(df, row_index(df, digest), product)
+        paged_dataframe(rows, key="drilldown_rows_page")
+
+# Function to render the demand forecast with days of cover and reorder points per product
+@st.fragment
+def render_demand_forecast(cube, digest, chart_top_n):
+    st.write("### Demand Forecast & Reorder Points")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        method = st.selectbox("Forecast model", ["Exponential smoothing", "Moving average"])
+        seasonal = st.checkbox("Seasonal", help="Scale by each month's share of total demand across all products.")
+    with col2:
+        if method == "Moving average":
+            window = st.slider("Months averaged", min_value=1, max_value=6, value=3)
+            alpha = 0.3
+        else:
+            alpha = st.slider("Smoothing (alpha)", min_value=0.05, max_value=0.95, value=0.3, step=0.05)
+            window = 3
+    with col3:
+        lead_time_days = st.number_input("Lead time (days)", min_value=1, max_value=180, value=14)
+    with col4:
+        service_level = st.slider("Service level", min_value=0.50, max_value=0.99, value=0.95, step=0.01)
+
+    # All products are fitted together on the cached quantity matrix
+    with timed("demand forecast", cached=True):
+        forecast_data = forecast_demand(
+            forecast_matrices(cube, digest),
+            'moving_average' if method == "Moving average" else 'exponential',
+            window, alpha, seasonal, lead_time_days, service_level
+        )
+    st.caption(f"{int(forecast_data['REORDER'].sum()):,} of {len(forecast_data):,} products are at or below "
+               f"their reorder point")
+
+    # Most urgent products: stock on hand against the reorder point
+    urgent = forecast_data.head(chart_top_n)[['PRODUCT', 'ACTUAL_STOCK', 'REORDER_POINT', 'DAYS_OF_COVER']]
+    show_chart("demand forecast", reorder_chart, compact_categories(urgent))
+
+    paged_dataframe(forecast_data, key="forecast_page")
+    download_buttons(lambda: frame_chunks(forecast_data), "demand_forecast", key="download_forecast")
+
+# Function to render the average sales per price range with a trend line
+@st.fragment
+def render_price_correlation(price_sales, precomputed):
+    col1, col2 = st.columns(2)
+    with col1:
+        method = st.radio(
+            "Price bins", ["Equal width", "Quantile"], horizontal=True,
+            help="Equal width splits the price range evenly; quantile bins hold about the same number of sales rows."
+        )
+    with col2:
+        bins = st.slider("Number of bins", min_value=2, max_value=50, value=default_price_bins)
+
+    # Bin the price table and fit the trend on the bin midpoints; the default binning was
+    # started in the background
+    with timed("price bins"):
+        if method == "Equal width" and bins == default_price_bins:
+            price_sales_agg, (slope, intercept) = precomputed.result()
+        else:
+            price_sales_agg, (slope, intercept) = price_section(price_sales, bins, 'quantile' if method == "Quantile" else 'width')
+
+    # Scatter plot at the bin midpoints, plus the fitted trend line: two points are all the browser needs
+    bin_points = price_sales_agg[['PRICE_MID', 'PRICE_LABEL', 'SALES', 'COUNT']]
+    if pd.notna(slope):
+        ends = price_sales_agg['PRICE_MID'].iloc[[0, -1]].to_numpy()
+        trend = pd.DataFrame({'PRICE_MID': ends, 'SALES': slope * ends + intercept})
+        show_chart("price vs. sales", price_chart, bin_points, trend)
+        st.caption(f"Trend: {slope:+,.2f} average sales per GHS of price")
+    else:
+        show_chart("price vs. sales", price_chart, bin_points)
+
+# Function to render the ABC classification charts and tables
+@st.fragment
+def render_abc_classification(by_month, chart_top_n, precomputed):
+    # Create a list of the months present in the data (already in month order)
+    unique_months = by_month.loc[by_month['ROWS'] > 0, 'MONTH'].tolist()
+
+    # Add a filter for month selection
+    selected_months = st.multiselect("Select Month(s) to Filter", options=unique_months, default=unique_months)
+
+    # Thresholds on the cumulative sales percentage
+    a_threshold, b_threshold = st.slider(
+        "A / B cumulative sales thresholds (%)",
+        min_value=0, max_value=100, value=default_abc_thresholds,
+        help="Products up to the first threshold are A, up to the second are B, the rest are C."
+    )
+
+    # Sum the precomputed month columns for the selection; no rescan of the rows. The matrices
+    # and the default selection were computed in the background.
+    with timed("ABC classification"):
+        matrices, default_abc = precomputed.result()
+        if selected_months == unique_months and (a_threshold, b_threshold) == default_abc_thresholds:
+            abc_data = default_abc
+        else:
+            abc_data = abc_for_months(matrices, selected_months, a_threshold, b_threshold)
+
+    # Visualization of ABC Categories (top products plus one "Other" bar per category)
+    abc_chart_data = top_n_with_other(abc_data[['PRODUCT', 'SALES', 'CATEGORY', 'CUMULATIVE_PERCENTAGE']],
+                                      'SALES', chart_top_n, group_col='CATEGORY')
+    show_chart("ABC classification", abc_chart, abc_chart_data)
+
+    # Display ABC summary
+    abc_summary = summarize_abc(abc_data)
+
+    # Create columns for side-by-side display
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.write("### Summary by Category")
+        st.dataframe(abc_summary)
+        download_buttons(lambda: frame_chunks(abc_summary), "abc_summary", key="download_abc_summary")
+
+    with col2:
+        st.write("### Top 5 Products in Category C")
+
+        # Filter for Category C products
+        category_c_products = abc_data[abc_data['CATEGORY'] == 'C']
+
+        # Get the top 5 products in Category C based on sales
+        top_c_products = category_c_products.nlargest(5, 'SALES')
+
+        # Display a bar chart of the top 5 products in Category C
+        show_chart("top category C", top_c_chart, top_c_products)
+
+    # Add a dash to separate sections
+    st.markdown("---")  # Dash to separate sections
+
+    # Display Product-Level Classification
+    st.write("### Product-Level ABC Classification")
+    paged_dataframe(abc_data, key="abc_data_page")
+    download_buttons(lambda: frame_chunks(abc_data), "abc_classification", key="download_abc")
+
 # Sidebar for file upload
 st.sidebar.header("Upload Data")
-uploaded_file = st.sidebar.file_uploader("Choose a CSV file", type="csv")
-
-# Load data only if a file is uploaded
-if uploaded_file is not None:
-    df = load_data(uploaded_file)
+uploaded_files = st.sidebar.file_uploader(
+    "Choose CSV or Excel files",
+    type=upload_types,
+    accept_multiple_files=True,
+    help="Upload one file, or one file per month or branch; they are merged into one dataset. "
+         "Workbooks are read sheet by sheet, and a sheet named after a month gives its rows that MONTH."
+)
+delta_files = st.sidebar.file_uploader(
+    "Append new period",
+    type=upload_types,
+    accept_multiple_files=True,
+    help="Upload only the new month(s). They are checked against the dataset above and merged "
+         "into its cached aggregates instead of reprocessing the whole history."
+)
+engines = ["In memory (pandas)", "Streaming (pandas, chunked)"] + (["DuckDB (SQL, out-of-core)"] if duckdb_available else [])
+engine = st.sidebar.radio(
+    "Processing engine",
+    engines,
+    help="In memory keeps the full table. Streaming reads the files in chunks and keeps only the "
+         "aggregates. DuckDB (when installed) aggregates with multi-threaded SQL and spills to disk."
+)
+streaming_mode = engine.startswith("Streaming")
+page = st.sidebar.radio("Page", ["Dashboard", "Product drill-down"], horizontal=True)
+sql_mode = engine.startswith("DuckDB")
+
+# Rows per chunk in streaming mode
+stream_chunk_rows = 500_000
+
+# Limits on what is sent to the browser: marks per product chart and rows per table page
+chart_top_n = st.sidebar.number_input(
+    "Products per chart",
+    min_value=5, max_value=1000, value=50, step=5,
+    help="Product charts show the top products and fold the rest into \"Other\" bars."
+)
+table_page_size = 500
+
+# Opt-in performance panel; memory is traced (process-wide) only while its timed sections run
+perf_enabled = st.sidebar.checkbox(
+    "Performance panel",
+    key="perf_enabled",
+    help="Show the wall time, peak memory, cache hits and chart payload of every section. "
+         "Slows the app down while enabled."
+)
+if perf_enabled:
+    st.session_state['perf_run'] = st.session_state.get('perf_run', 0) + 1  # Number the full reruns
+
+# Load data only if files are uploaded
+if uploaded_files:
+    # Content hash: identical uploads share in-process and on-disk cache entries
+    with timed("file digest", cached=True):
+        digest = dataset_digest(uploaded_files)
+
+    # DuckDB reads CSV files only; workbooks go through the streaming engine instead
+    if sql_mode and any(is_excel(file.name) for file in uploaded_files):
+        st.sidebar.info("DuckDB reads CSV files only; the workbooks are aggregated with the streaming engine.")
+        sql_mode, streaming_mode = False, True
+
+    df = None  # Source rows, only kept by the in-memory engine
+    source_files = list(uploaded_files)  # Files behind the dataset, for the full export
+    if sql_mode:
+        # Aggregate in DuckDB; only the aggregates come back to pandas
+        with timed("sql_aggregates", cached=True):
+            aggregates = sql_aggregates(uploaded_files, digest)
+        st.sidebar.caption(f"Aggregated {aggregates[4]['ROWS'].sum():,} rows with DuckDB")
+    elif streaming_mode:
+        # Fold the files into the aggregates chunk by chunk; the raw rows are never kept
+        progress_bar = st.sidebar.progress(0.0, text="Streaming files...")
+        with timed("stream_aggregates", cached=True):
+            aggregates = stream_aggregates(uploaded_files, digest, stream_chunk_rows, _progress=progress_bar.progress)
+        progress_bar.empty()
+        st.sidebar.caption(f"Streamed {aggregates[4]['ROWS'].sum():,} rows into the aggregates")
+    else:
+        with timed("load_data", cached=True):
+            df = load_data(uploaded_files, digest)
+
+        # Report the memory used by the typed frame
+        with timed("memory_report", cached=True):
+            typed_bytes, untyped_bytes = memory_report(df, digest)
+        st.sidebar.caption(
+            f"Loaded {len(df):,} rows from {len(uploaded_files)} file(s) using {typed_bytes / 1e6:,.1f} MB "
+            f"({(untyped_bytes - typed_bytes) / 1e6:,.1f} MB saved by typed columns)"
+        )
 
-    # Check if the dataframe is empty
-    if df.empty:
-        st.error("The uploaded file is empty. Please upload a valid CSV file.")
+        with timed("build_aggregates", cached=True):
+            aggregates = build_aggregates(df, digest)
+
+    # Fold the new period into the aggregates; the combined dataset gets its own digest
+    if delta_files:
+        with timed("file digest", cached=True):
+            delta_digest = hashlib.sha256(f"{digest}+{dataset_digest(delta_files)}".encode()).hexdigest()
+        try:
+            with timed("append_delta", cached=True):
+                appended = append_delta(aggregates, delta_files, delta_digest, streaming_mode)
+        except ValueError as error:
+            st.sidebar.error(f"New period not appended: {error}")
+        else:
+            added_rows = appended[4]['ROWS'].sum() - aggregates[4]['ROWS'].sum()
+            st.sidebar.caption(f"Appended {added_rows:,} rows from {len(delta_files)} file(s)")
+            aggregates, digest = appended, delta_digest
+            df = None  # The loaded rows no longer cover the whole dataset
+            source_files += delta_files
+
+    # Aggregate cube shared by the KPI cards, charts and ABC section
+    cube, by_product, by_month, price_sales, row_totals = aggregates
+
+    # Rows without a product or a recognized month count in the headline totals but not in the cube
+    rows_outside_cube = row_totals['ROWS'].sum() - by_month['ROWS'].sum()
+    if rows_outside_cube > 0 and not by_product.empty:
+        st.warning(f"{rows_outside_cube:,} of {row_totals['ROWS'].sum():,} rows have no product or no recognized "
+                   f"month (a full month name such as \"January\"). They are included in the Key Insights totals "
+                   f"but left out of the charts and tables.")
+
+    # Check if the data is empty
+    if row_totals['ROWS'].sum() == 0:
+        st.error("The uploaded data is empty. Please upload a valid CSV file.")
+    elif by_product.empty:
+        st.error(f"None of the {row_totals['ROWS'].sum():,} rows has both a product and a recognized month "
+                 f"(a full month name such as \"January\"), so there is nothing to show.")
+    elif page == "Product drill-down":
+        render_product_drilldown(cube, by_product, df, digest)
     else:
-        # Convert MONTH to a categorical type with a specific order
-        month_order = ['January', 'February', 'March', 'April', 'May', 'June', 
-                       'July', 'August', 'September', 'October', 'November', 'December']
-        df['MONTH'] = pd.Categorical(df['MONTH'], categories=month_order, ordered=True)
+        # Start the stock, price and ABC sections in the background before rendering anything
+        precomputed = start_precompute(cube, by_product, by_month, price_sales, digest, streaming_mode)
 
         # Executive Summary
         st.title("Sales Analysis Dashboard - Nurtureholiks")
@@ -94,22 +1000,14 @@ if uploaded_file is not None:
         # Key Metrics
         st.subheader("Key Insights")
 
-        # Calculate total sales
-        total_sales = df['SALES'].sum()
-
-        # Calculate total units sold
-        total_units_sold = df['QTY_SOLD'].sum()
-
-        # Calculate total number of unique products
-        total_products = df['PRODUCT'].nunique()
-
-        # Calculate top performing product
-        top_product = df.groupby('PRODUCT')['SALES'].sum().idxmax()  
-        top_product_sales = df.groupby('PRODUCT')['SALES'].sum().max()
-
-        # Calculate top month
-        top_month = df.groupby('MONTH')['SALES'].sum().idxmax()  # Get the month with the highest sales
-        top_month_sales = df.groupby('MONTH')['SALES'].sum().max()  # Get the sales amount for the top month
+        # Calculate total sales, units, products, top product and top month
+        with timed("key metrics"):
+            metrics = key_metrics(row_totals, by_month)
+        total_sales = metrics['total_sales']
+        total_units_sold = metrics['total_units_sold']
+        total_products = metrics['total_products']
+        top_product = metrics['top_product']
+        top_month = metrics['top_month']
 
         # Create columns for the cards
         col1, col2, col3, col4, col5 = st.columns(5)
@@ -177,51 +1075,16 @@ if uploaded_file is not None:
 
         # Total Sales Over Time
         st.subheader("Total Sales Over Time")
-        total_sales_over_time = df.groupby('MONTH', observed=False)['SALES'].sum().reset_index()
-        chart_sales_over_time = alt.Chart(total_sales_over_time).mark_line(point=True).encode(
-            x=alt.X('MONTH:O', title='Month', sort=month_order),
-            y=alt.Y('SALES:Q', title='Total Sales'),
-            tooltip=['MONTH', 'SALES']
-        ).properties(title="Total Sales Over Time")
-        st.altair_chart(chart_sales_over_time, use_container_width=True)
-
-        # Monthly Sales Trends
-        st.subheader("Monthly Sales Trends")
-        monthly_sales_trends = df.groupby(['MONTH', 'PRODUCT'], observed=False)['SALES'].sum().reset_index()
-
-        # Get unique products for filtering
-        unique_products = monthly_sales_trends['PRODUCT'].unique()
-
-        # Create a multiselect widget for product selection
-        selected_products = st.multiselect(
-            "Select Products to Display",
-            options=unique_products,
-            default=unique_products[:2]  # Default to the first two products
-        )
-
-        # Filter the data based on selected products
-        filtered_monthly_sales_trends = monthly_sales_trends[monthly_sales_trends['PRODUCT'].isin(selected_products)]
+        total_sales_over_time = by_month[['MONTH', 'SALES']]
+        show_chart("sales over time", sales_over_time_chart, total_sales_over_time)
 
-        # Create the chart
-        chart_monthly_trends = alt.Chart(filtered_monthly_sales_trends).mark_line(point=True).encode(
-            x=alt.X('MONTH:O', title='Month', sort=month_order),
-            y=alt.Y('SALES:Q', title='Sales'),
-            color='PRODUCT:N',
-            tooltip=['MONTH', 'PRODUCT', 'SALES']
-        ).properties(title="Monthly Sales Trends")
-
-        # Display the chart
-        st.altair_chart(chart_monthly_trends, use_container_width=True)
+        # Monthly Sales Trends (reruns on its own when its filter changes)
+        render_monthly_sales_trends(cube, by_product, chart_top_n)
 
         # Sales by Product
         st.subheader("Sales by Product")
-        sales_by_product = df.groupby('PRODUCT')['SALES'].sum().reset_index()
-        chart_sales_by_product = alt.Chart(sales_by_product).mark_bar().encode(
-            x=alt.X('PRODUCT:O', title='Product', sort='-y'),
-            y=alt.Y('SALES:Q', title='Sales'),
-            tooltip=['PRODUCT', 'SALES']
-        ).properties(title="Sales by Product")
-        st.altair_chart(chart_sales_by_product, use_container_width=True)
+        sales_by_product = by_product[['PRODUCT', 'SALES']]
+        show_chart("sales by product", sales_by_product_chart, top_n_with_other(sales_by_product, 'SALES', chart_top_n))
 
         # -------------------------
         # Sales Contribution by Product Category
@@ -231,27 +1094,17 @@ if uploaded_file is not None:
         st.subheader("Sales Contribution by Product Category")
 
         # Ensure the DataFrame is not empty
-        if df.empty:
+        if by_product.empty:
             st.error("The data frame is empty. Please upload valid sales data.")
         else:
             # Calculate total sales by product
-            sales_contribution = df.groupby('PRODUCT')['SALES'].sum().reset_index()
+            sales_contribution = by_product[['PRODUCT', 'SALES']]
 
             # Sort by sales in descending order and get the top 20 products
             top_sales_contribution = sales_contribution.sort_values(by='SALES', ascending=False).head(20)
 
             # Create a pie chart for the top 20 products
-            pie_chart = alt.Chart(top_sales_contribution).mark_arc().encode(
-                theta=alt.Theta('SALES:Q', title='Sales'),
-                color=alt.Color('PRODUCT:N', title='Product'),
-                tooltip=['PRODUCT', 'SALES']
-            ).properties(
-                title="Sales Contribution by Top 20 Products",
-                width=400,
-                height=400
-            )
-
-            st.altair_chart(pie_chart, use_container_width=True)
+            show_chart("sales contribution", sales_contribution_chart, compact_categories(top_sales_contribution))
 
         # -------------------------
         # Stock Analysis Logic
@@ -261,80 +1114,28 @@ if uploaded_file is not None:
         st.subheader("Stock Analysis")
 
         # Ensure the DataFrame is not empty
-        if df.empty:
+        if by_product.empty:
             st.error("The data frame is empty. Please upload valid sales data.")
         else:
-            # Perform stock analysis
-            stock_analysis = df.groupby('PRODUCT').agg({'TOTAL_STOCK': 'sum', 'ACTUAL_STOCK': 'sum', 'SALES': 'sum'}).reset_index()
-
-            # Sort the stock analysis by TOTAL_STOCK in descending order
-            stock_analysis = stock_analysis.sort_values(by='TOTAL_STOCK', ascending=False)
-
-            # Optional: Create a bar chart for stock analysis
-            stock_chart = alt.Chart(stock_analysis).mark_bar().encode(
-                x=alt.X('PRODUCT:N', title='Product', sort='-y'),
-                y=alt.Y('TOTAL_STOCK:Q', title='Total Stock'),
-                tooltip=['PRODUCT', 'TOTAL_STOCK', 'ACTUAL_STOCK', 'SALES']
-            ).properties(
-                title="Total Stock Analysis",
-                width=800,
-                height=400
-            )
-
-            st.altair_chart(stock_chart, use_container_width=True)
-
-        # Price vs. Sales Correlation
-        st.subheader("Price vs. Sales Correlation")
-
-        # Create price bins and labels
-        price_bins = pd.cut(df['PRICE_(GHS)'], bins=10)  # Create 10 price bins
-        price_sales_agg = df.groupby(price_bins).agg({'SALES': 'mean'}).reset_index()
-
-        # Create descriptive labels for the bins
-        price_sales_agg['PRICE_LABEL'] = price_sales_agg['PRICE_(GHS)'].apply(lambda x: f"{x.left:.2f} - {x.right:.2f}")
-
-        # Create a scatter plot with a trend line
-        scatter_chart = alt.Chart(price_sales_agg).mark_circle(size=60).encode(
-            x=alt.X('PRICE_LABEL:O', title='Price Range (GHS)', axis=alt.Axis(labelAngle=0)),
-            y=alt.Y('SALES:Q', title='Average Sales'),
-            tooltip=['PRICE_LABEL', 'SALES']
-        ).properties(title="Price vs. Average Sales")
-
-        # Add a trend line
-        trend_line = scatter_chart.transform_regression('PRICE_LABEL', 'SALES').mark_line(color='red')
-
-        # Combine scatter plot and trend line
-        final_chart = scatter_chart + trend_line
+            # Stock analysis (sorted by TOTAL_STOCK in descending order), computed in the background
+            with timed("stock analysis"):
+                stock_analysis = precomputed['stock'].result()
 
-        # Display the chart
-        st.altair_chart(final_chart, use_container_width=True)
+            # Optional: Create a bar chart for stock analysis (top products plus "Other")
+            stock_chart_data = top_n_with_other(stock_analysis, 'TOTAL_STOCK', chart_top_n,
+                                                sum_cols=['TOTAL_STOCK', 'ACTUAL_STOCK', 'SALES'])
+            show_chart("stock analysis", stock_chart, stock_chart_data)
+            download_buttons(lambda: frame_chunks(stock_analysis), "stock_analysis", key="download_stock")
 
-        # Monthly Performance Comparison
-        st.subheader("Monthly Performance Comparison")
+            # Demand forecast (reruns on its own when its model settings change)
+            render_demand_forecast(cube, digest, chart_top_n)
 
-        # Get unique products for filtering
-        unique_products_performance = df['PRODUCT'].unique()
-
-        # Create a multiselect widget for product selection with a unique key
-        selected_products_performance = st.multiselect(
-            "Select Products to Display",
-            options=unique_products_performance,
-            default=unique_products_performance[:2]  # Default to the first two products
-        )
-
-        # Filter the data based on selected products
-        filtered_monthly_performance = df[df['PRODUCT'].isin(selected_products_performance)]
-
-        # Create the chart for quantity sold
-        chart_heatmap = alt.Chart(filtered_monthly_performance).mark_line(point=True).encode(
-            x=alt.X('MONTH:O', title='Month', sort=month_order),
-            y=alt.Y('QTY_SOLD:Q', title='Quantity Sold'),  # Change to quantity sold
-            color='PRODUCT:N',
-            tooltip=['MONTH', 'PRODUCT', 'QTY_SOLD']  # Update tooltip
-        ).properties(title="Monthly Performance Comparison (Quantity Sold)")
+        # Price vs. Sales Correlation (reruns on its own when its binning changes)
+        st.subheader("Price vs. Sales Correlation")
+        render_price_correlation(price_sales, precomputed['price'])
 
-        # Display the chart
-        st.altair_chart(chart_heatmap, use_container_width=True)
+        # Monthly Performance Comparison (reruns on its own when its filter changes)
+        render_performance_comparison(cube, by_product, chart_top_n)
 
         # -------------------------
         # ABC Classification Logic
@@ -344,98 +1145,11 @@ if uploaded_file is not None:
         st.subheader("ABC Classification")
 
         # Ensure the DataFrame is not empty
-        if df.empty:
+        if by_product.empty:
             st.error("The data frame is empty. Please upload valid sales data.")
         else:
-            # Define the correct order of months
-            month_order = ['January', 'February', 'March', 'April', 'May', 'June', 
-                           'July', 'August', 'September', 'October', 'November', 'December']
-
-            # Create a list of unique months from the data and convert to categorical
-            unique_months = df['MONTH'].unique().tolist()
-            unique_months = sorted(unique_months, key=lambda x: month_order.index(x))  # Sort based on month order
-
-            # Add a filter for month selection
-            selected_months = st.multiselect("Select Month(s) to Filter", options=unique_months, default=unique_months)
-
-            # Filter the DataFrame based on selected months
-            filtered_df = df[df['MONTH'].isin(selected_months)]
-
-            # Calculate cumulative sales percentage for the filtered data
-            abc_data = filtered_df.groupby('PRODUCT')['SALES'].sum().reset_index()
-            abc_data = abc_data.sort_values(by='SALES', ascending=False)
-            abc_data['CUMULATIVE_SALES'] = abc_data['SALES'].cumsum()
-            abc_data['CUMULATIVE_PERCENTAGE'] = 100 * abc_data['CUMULATIVE_SALES'] / abc_data['SALES'].sum()
-
-            # Assign ABC categories based on dynamic thresholds
-            def assign_abc_category(cum_percentage, a_threshold=20, b_threshold=50):
-                if cum_percentage <= a_threshold:
-                    return 'A'
-                elif cum_percentage <= b_threshold:
-                    return 'B'
-                else:
-                    return 'C'
-
-            # Apply the classification function
-            abc_data['CATEGORY'] = abc_data['CUMULATIVE_PERCENTAGE'].apply(assign_abc_category)
-
-            # Visualization of ABC Categories
-            abc_chart = alt.Chart(abc_data).mark_bar().encode(
-                x=alt.X('PRODUCT:N', title='Product', sort='-y'),
-                y=alt.Y('SALES:Q', title='Sales'),
-                color=alt.Color('CATEGORY:N', title='ABC Category', scale=alt.Scale(domain=['A', 'B', 'C'], range=['#6a11cb', '#2575fc', '#ffcc00'])),  # C color changed to yellow
-                tooltip=['PRODUCT', 'SALES', 'CATEGORY', 'CUMULATIVE_PERCENTAGE']
-            ).properties(
-                title="ABC Classification by Product",
-                width=800,
-                height=400
-            ).configure_mark(
-                opacity=0.8
-            )
-
-            st.altair_chart(abc_chart, use_container_width=True)
-
-            # Display ABC summary
-            abc_summary = abc_data.groupby('CATEGORY')['SALES'].sum().reset_index()
-            abc_summary['PERCENTAGE'] = 100 * abc_summary['SALES'] / abc_summary['SALES'].sum()
-            
-            # Create columns for side-by-side display
-            col1, col2 = st.columns(2)
-
-            with col1:
-                st.write("### Summary by Category")
-                st.dataframe(abc_summary)
-
-            with col2:
-                st.write("### Top 5 Products in Category C")
-                
-                # Filter for Category C products
-                category_c_products = abc_data[abc_data['CATEGORY'] == 'C']
-
-                # Get the top 5 products in Category C based on sales
-                top_c_products = category_c_products.nlargest(5, 'SALES')
-
-                # Create a bar chart for the top 5 products in Category C
-                top_c_chart = alt.Chart(top_c_products).mark_bar().encode(
-                    y=alt.Y('PRODUCT:N', title='Product', sort='-y'),
-                    x=alt.X('SALES:Q', title='Sales'),
-                    color=alt.value('#ffcc00'),  # Use a distinct color for visibility
-                    tooltip=['PRODUCT', 'SALES']
-                ).properties(
-                    title="Top 5 Products in Category C",
-                    width=400,
-                    height=400
-                )
-
-                # Display the chart
-                st.altair_chart(top_c_chart, use_container_width=True)
-
-            # Add a dash to separate sections
-            st.markdown("---")  # Dash to separate sections
-
-            # Display Product-Level Classification
-            st.write("### Product-Level ABC Classification")
-            st.dataframe(abc_data)
+            # ABC classification (reruns on its own when its month filter, thresholds or page change)
+            render_abc_classification(by_month, chart_top_n, precomputed['abc'])
 
             # General Tips
             st.markdown("---")  # Dash to separate tips
@@ -448,6 +1162,24 @@ if uploaded_file is not None:
             - **Use Data for Decision Making**: Leverage the insights gained from ABC classification to inform purchasing, marketing, and sales strategies.
             """)
 
+        # -------------------------
+        # Exports
+        # -------------------------
+
+        st.markdown("---")  # Dash to separate sections
+        st.subheader("Export Data")
+        st.caption("Files are written in chunks when a button is clicked.")
+        export_tables = {
+            "Sales by product": ('sales_by_product', lambda: frame_chunks(by_product)),
+            "Sales by month": ('sales_by_month', lambda: frame_chunks(by_month)),
+            "Product x month cube": ('product_month_cube', lambda: frame_chunks(cube)),
+            "Price bins": ('price_bins', lambda: frame_chunks(precomputed['price'].result()[0])),
+            "Full dataset (normalized rows)": ('sales_data', lambda: dataset_chunks(df, source_files)),
+        }
+        for label, (name, chunks) in export_tables.items():
+            st.write(f"**{label}**")
+            download_buttons(chunks, name, key=f"download_{name}")
+
 else:
     st.markdown("""
         <div style="background: linear-gradient(135deg, #6a11cb 0%, #2575fc 100%);
@@ -465,7 +1197,7 @@ else:
     st.markdown("### How to Use the Dashboard")
     st.write("""
     1. **Upload Your Data**:
-       - Use the file uploader in the sidebar to upload your sales data as a CSV file.
+       - Use the file uploader in the sidebar to upload your sales data as a CSV file, or as an Excel workbook with one sheet per month (the sheet name is used as the month). You can also upload several files at once (for example one per month or branch) and they will be merged.
        - Ensure your file includes columns the following columns (in the order provided): PRODUCT, MONTH, PRICE, QTY SOLD, SALES, TOTAL STOCK, STOCK LEFT(EXCEL), ACTUAL STOCK, SYSTEM STOCK, SURPLUS & SHORTAGE.
     
     2. **Analyze Key Metrics**:
@@ -531,3 +1263,31 @@ else:
     for faq in faq_data:
         with st.expander(faq["question"], expanded=False):
             st.write(faq["answer"])
+
+# Performance panel, newest records first. Sections rerun on their own as fragments are
+# logged under the current run number and appear here with the next full rerun.
+if perf_enabled:
+    perf_log = pd.DataFrame(st.session_state.get('perf_log', []))
+    with st.sidebar.expander("Performance", expanded=True):
+        if perf_log.empty:
+            st.caption("No sections timed yet.")
+        else:
+            this_run = perf_log[perf_log['run'] == st.session_state['perf_run']]
+            st.caption(f"This rerun: {this_run['seconds'].sum():,.3f} s in {len(this_run)} timed sections")
+            st.caption("Peak memory is traced for the whole server process, so it also counts other "
+                       "sessions and the background workers; treat it as approximate.")
+            st.dataframe(perf_log.iloc[::-1], hide_index=True)
+
+            # Shared dataset store counters (all sessions on this server)
+            store = dataset_store().summary()
+            st.caption(
+                f"Shared datasets: {store['entries']} entries, {store['mb']:,.1f} of {store['max_mb']:,.1f} MB; "
+                f"{store['hits']} hits, {store['misses']} misses, {store['evictions']} evicted, "
+                f"{store['expirations']} expired"
+            )
+            st.download_button(
+                "Download log (JSON lines)",
+                data=perf_log.to_json(orient='records', lines=True),
+                file_name="dashboard_performance.jsonl",
+                mime="application/json"
+            )
@@ -0,0 +1,145 @@
+# Benchmarks for every dashboard computation on synthetic data of increasing size:
+#
+#     python benchmark.py                                  # 10k, 100k and 1M rows
+#     python benchmark.py --rows 10000000 --products 50000
+#     python benchmark.py --save-baseline                  # record the current numbers
+#
+# Each stage is timed (best of --repeat runs) and memory-profiled (peak allocations traced by
+# tracemalloc; buffers allocated inside pyarrow are not included).
+# Results are compared with the stored baseline and the run fails if a stage got slower
+# than the baseline by more than --tolerance, or its peak memory grew by more than --memory-tolerance.
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from ingest import load_csv
+from analytics import (aggregate_rows, finish_aggregates, stream_csv_aggregates, key_metrics, price_sales_bins,
+                       summarize_stock, month_matrices, abc_for_months, demand_matrices,
+                       forecast_demand)
+from generate_data import write_sales_csv
+
+# Ignore differences below this many seconds when flagging regressions (timer noise)
+noise_floor_seconds = 0.005
+# Ignore peak memory differences below this many MB (small allocations by pandas internals)
+noise_floor_mb = 0.5
+
+# Function to run fn repeat times and return its result, best wall time and peak traced memory
+def measure(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+
+    # Separate traced run: tracemalloc slows allocations down and would skew the timing
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, best, peak
+
+# Function to benchmark every stage on one generated file
+def benchmark_case(path, repeat):
+    def load():
+        with open(path, 'rb') as file:
+            return load_csv(file)
+
+    def stream():
+        with open(path, 'rb') as file:
+            return stream_csv_aggregates([file], 500_000)
+
+    results = {}
+
+    def stage(name, fn):
+        result, seconds, peak = measure(fn, repeat)
+        results[name] = {'seconds': round(seconds, 6), 'peak_mb': round(peak / 1e6, 3)}
+        return result
+
+    df = stage('load_csv', load)
+    aggregates = stage('aggregate', lambda: finish_aggregates(aggregate_rows(df)))
+    cube, by_product, by_month, price_sales, row_totals = aggregates
+    stage('stream_aggregate', stream)
+    stage('key_metrics', lambda: key_metrics(row_totals, by_month))
+    stage('stock_analysis', lambda: summarize_stock(by_product))
+    stage('price_bins', lambda: price_sales_bins(price_sales, bins=10))
+    matrices = stage('abc_matrices', lambda: month_matrices(cube))
+    months = by_month.loc[by_month['ROWS'] > 0, 'MONTH'].tolist()
+    stage('abc_classify', lambda: abc_for_months(matrices, months))
+    demand = stage('demand_matrices', lambda: demand_matrices(cube))
+    stage('demand_forecast', lambda: forecast_demand(demand, seasonal=True))
+    return results
+
+# Function to list the stages that got slower than the baseline by more than tolerance, or whose
+# peak memory grew by more than memory_tolerance, as (case, stage, metric, baseline, current)
+def regressions(results, baseline, tolerance, memory_tolerance):
+    checks = [('seconds', tolerance, noise_floor_seconds), ('peak_mb', memory_tolerance, noise_floor_mb)]
+    found = []
+    for case, stages in results.items():
+        for name, current in stages.items():
+            previous = baseline.get(case, {}).get(name)
+            if previous is None:
+                continue
+            for metric, allowed, noise_floor in checks:
+                if metric not in previous:
+                    continue
+                limit = max(previous[metric] * (1 + allowed), previous[metric] + noise_floor)
+                if current[metric] > limit:
+                    found.append((case, name, metric, previous[metric], current[metric]))
+    return found
+
+# Function to parse the command line, run the benchmarks and compare with the baseline
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard computations on synthetic sales data.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help="dataset sizes in rows (default: 10000 100000 1000000)")
+    parser.add_argument('--products', type=int, default=5_000, help="distinct products (default: 5000)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage (default: 3)")
+    parser.add_argument('--baseline', type=Path, default=Path('benchmark_baseline.json'),
+                        help="baseline file (default: benchmark_baseline.json)")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown against the baseline, as a fraction (default: 0.25)")
+    parser.add_argument('--memory-tolerance', type=float, default=0.10,
+                        help="allowed peak memory growth against the baseline, as a fraction (default: 0.10)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            case = f"{rows}x{args.products}"
+            path = Path(tmp) / f"{case}.csv"
+            write_sales_csv(path, rows, args.products)
+            results[case] = benchmark_case(path, args.repeat)
+
+            print(f"\n{case} ({path.stat().st_size / 1e6:,.1f} MB CSV)")
+            for name, result in results[case].items():
+                print(f"  {name:<18} {result['seconds'] * 1000:>10.1f} ms {result['peak_mb']:>10.1f} MB peak")
+
+    if args.save_baseline:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2) + '\n')
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one")
+        return 0
+
+    found = regressions(results, json.loads(args.baseline.read_text()), args.tolerance, args.memory_tolerance)
+    for case, name, metric, previous, current in found:
+        if metric == 'seconds':
+            change = f"{previous * 1000:.1f} ms -> {current * 1000:.1f} ms"
+        else:
+            change = f"{previous:.1f} MB -> {current:.1f} MB peak"
+        print(f"REGRESSION {case} {name}: {change}", file=sys.stderr)
+    if not found:
+        print(f"\nNo regressions against {args.baseline}")
+    return 1 if found else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
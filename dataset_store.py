@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pandas as pd
+
+# Function to estimate the memory held by a cached value: frames, arrays and tuples of them
+def value_bytes(value):
+    if isinstance(value, (tuple, list)):
+        return sum(value_bytes(item) for item in value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    return int(getattr(value, 'nbytes', 0))
+
+# Process-wide store of datasets keyed by content, shared by every session. Entries are
+# evicted least recently used first when the store goes over max_bytes, and expire ttl
+# seconds after their last use. Values are shared, not copied: callers must not modify them.
+class DatasetStore:
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = {}  # key -> (value, size, last used); dicts keep insertion order
+        self.building = {}  # key -> lock held while the value is built
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    # Function to return the value for key, building it with build() on a miss. Sessions
+    # asking for the same key at the same time wait for a single build.
+    def get_or_build(self, key, build):
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self.lock:
+            key_lock = self.building.setdefault(key, threading.Lock())
+        with key_lock:
+            value = self.get(key, count=False)  # Built by another session while we waited
+            if value is None:
+                with self.lock:
+                    self.stats['misses'] += 1
+                value = build()
+                self.put(key, value)
+            else:
+                with self.lock:
+                    self.stats['hits'] += 1
+        with self.lock:
+            self.building.pop(key, None)
+        return value
+
+    # Function to look up a value, or None when it is missing or expired
+    def get(self, key, count=True):
+        with self.lock:
+            self.expire()
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            value, size, _ = entry
+            self.entries[key] = (value, size, time.monotonic())  # Move to the most recent end
+            if count:
+                self.stats['hits'] += 1
+            return value
+
+    # Function to add a value and evict the least recently used entries over the budget.
+    # A value larger than the whole budget is returned to the caller but not kept.
+    def put(self, key, value):
+        size = value_bytes(value)
+        with self.lock:
+            self.entries.pop(key, None)
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (value, size, time.monotonic())
+            while self.total_bytes() > self.max_bytes:
+                del self.entries[next(iter(self.entries))]
+                self.stats['evictions'] += 1
+
+    # Function to drop the entries not used for ttl seconds; the caller holds the lock
+    def expire(self):
+        cutoff = time.monotonic() - self.ttl
+        for key in [key for key, (_, _, used) in self.entries.items() if used < cutoff]:
+            del self.entries[key]
+            self.stats['expirations'] += 1
+
+    # Function to total the size of the entries; the caller holds the lock
+    def total_bytes(self):
+        return sum(size for _, size, _ in self.entries.values())
+
+    # Function to report the counters and the current size of the store
+    def summary(self):
+        with self.lock:
+            self.expire()
+            return {**self.stats, 'entries': len(self.entries), 'mb': round(self.total_bytes() / 1e6, 1),
+                    'max_mb': round(self.max_bytes / 1e6, 1)}
@@ -0,0 +1,88 @@
+import pandas as pd
+
+from ingest import month_order, column_schema, normalize_columns
+from analytics import available_measures, check_columns, finish_aggregates
+
+# Optional: DuckDB runs the aggregations as multi-threaded SQL straight off the files,
+# reading only the columns it needs and spilling to disk when they do not fit in memory
+try:
+    import duckdb
+    duckdb_available = True
+except ImportError:
+    duckdb = None
+    duckdb_available = False
+
+# Function to quote a column name for SQL
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+# Function to build the dashboard aggregates from CSV or Parquet files with DuckDB.
+# Returns the same frames as analytics.finish_aggregates; only those small results
+# are materialized in pandas.
+def duckdb_aggregates(paths, threads=None, memory_limit=None):
+    paths = [str(path) for path in paths]
+    con = duckdb.connect()
+    try:
+        if threads:
+            con.execute(f"SET threads = {int(threads)}")
+        if memory_limit:
+            con.execute(f"SET memory_limit = '{memory_limit}'")
+
+        if all(path.endswith('.parquet') for path in paths):
+            source = con.read_parquet(paths, union_by_name=True)
+        else:
+            # Every column as text: the type sniffer only samples the file, so a stray text cell far
+            # down a number column would fail the query, and product codes would lose leading zeros.
+            # The measures are cast below.
+            source = con.read_csv(paths, union_by_name=True, all_varchar=True)
+        source.create_view('source')
+
+        # Map the normalized column names onto the raw headers
+        raw = dict(zip(normalize_columns(source.columns), source.columns))
+        check_columns(raw, ', '.join(paths))
+        product = f"NULLIF(CAST({quote(raw['PRODUCT'])} AS VARCHAR), '')"
+        month = f"CAST({quote(raw['MONTH'])} AS VARCHAR)"
+
+        # Same rules as the ingestion schema: unparseable numbers count as missing
+        def number(col):
+            return f"TRY_CAST({quote(raw[col])} AS DOUBLE)"
+
+        # Reconciliation measures without a column are left out, as in the pandas engine
+        measures = available_measures(raw)
+        sums = ', '.join(f"COALESCE(SUM({number(measure)}), 0) AS {quote(measure)}" for measure in measures)
+        cells = con.execute(f"""
+            SELECT {product} AS PRODUCT, {month} AS MONTH, {sums}, COUNT(*) AS ROWS
+            FROM source
+            WHERE {product} IS NOT NULL AND {month} IN ({', '.join('?' for _ in month_order)})
+            GROUP BY ALL
+        """, month_order).df()
+        prices = con.execute(f"""
+            SELECT {number('PRICE_(GHS)')} AS "PRICE_(GHS)",
+                   COALESCE(SUM({number('SALES')}), 0) AS SALES,
+                   COUNT({number('SALES')}) AS COUNT
+            FROM source
+            WHERE {number('PRICE_(GHS)')} IS NOT NULL
+            GROUP BY ALL
+        """).df()
+        # Row totals per product (NULL for rows without one), whatever the month
+        totals = con.execute(f"""
+            SELECT {product} AS PRODUCT,
+                   COALESCE(SUM({number('SALES')}), 0) AS SALES,
+                   COALESCE(SUM({number('QTY_SOLD')}), 0) AS QTY_SOLD,
+                   COUNT(*) AS ROWS
+            FROM source
+            GROUP BY ALL
+        """).df()
+    finally:
+        con.close()
+
+    # Whole-number measures (stock counts) come back as integers, as from the pandas engine
+    for measure in measures:
+        if column_schema[measure] == 'integer' and (cells[measure] % 1 == 0).all():
+            cells[measure] = cells[measure].astype('int64')
+    if (totals['QTY_SOLD'] % 1 == 0).all():
+        totals['QTY_SOLD'] = totals['QTY_SOLD'].astype('int64')
+
+    cells['MONTH'] = pd.Categorical(cells['MONTH'], categories=month_order, ordered=True)
+    cells = cells.set_index(['PRODUCT', 'MONTH'])
+    return finish_aggregates((cells, prices.set_index('PRICE_(GHS)'), totals.set_index('PRODUCT')))
@@ -0,0 +1,103 @@
+import io
+import tempfile
+
+import pandas as pd
+
+from ingest import column_schema
+
+# Optional: pyarrow writes Parquet row group by row group
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    parquet_available = True
+except ImportError:
+    pa = pq = None
+    parquet_available = False
+
+# Optional: openpyxl's write-only workbooks stream rows to the file instead of keeping cells in memory
+try:
+    from openpyxl import Workbook
+    excel_available = True
+except ImportError:
+    Workbook = None
+    excel_available = False
+
+# Export formats: file extension and MIME type, for the writers that are installed
+export_formats = {'CSV': ('csv', 'text/csv')}
+if parquet_available:
+    export_formats['Parquet'] = ('parquet', 'application/vnd.apache.parquet')
+if excel_available:
+    export_formats['Excel'] = ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+# Rows per chunk written, and the largest export kept in memory before it spills to disk
+export_chunk_rows = 100_000
+spool_max_bytes = 16 * 1024 * 1024
+
+# Data rows per Excel sheet (the format's row limit, minus the header row); longer exports continue on new sheets
+excel_sheet_rows = 1_048_575
+
+# Function to split a frame into row slices of at most chunk_rows, without copying it
+def frame_chunks(frame, chunk_rows=export_chunk_rows):
+    if frame.empty:
+        yield frame
+    for start in range(0, len(frame), chunk_rows):
+        yield frame.iloc[start:start + chunk_rows]
+
+# Function to write chunks as CSV, one header row
+def write_csv(chunks, file):
+    text = io.TextIOWrapper(file, encoding='utf-8', newline='', write_through=True)
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(text, header=i == 0, index=False)
+    text.detach()  # Leave the underlying file open
+
+# Function to derive the Parquet schema from the first chunk. Text columns are written as strings and
+# whole-number columns as int64, so chunks whose categories or downcast integer types differ still match.
+def export_schema(chunk):
+    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+    for i, field in enumerate(schema):
+        dtype = chunk[field.name].dtype
+        if isinstance(dtype, pd.CategoricalDtype) or column_schema.get(field.name) == 'category':
+            schema = schema.set(i, pa.field(field.name, pa.string()))
+        elif pd.api.types.is_integer_dtype(dtype):
+            schema = schema.set(i, pa.field(field.name, pa.int64()))
+    return schema
+
+# Function to write chunks as Parquet, one row group per chunk
+def write_parquet(chunks, file):
+    writer = None
+    for chunk in chunks:
+        if writer is None:
+            schema = export_schema(chunk)
+            writer = pq.ParquetWriter(file, schema)
+        writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    if writer is not None:
+        writer.close()
+
+# Function to write chunks as an Excel workbook, streaming rows through a write-only sheet
+def write_excel(chunks, file):
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows = None, 0
+    for chunk in chunks:
+        start = 0
+        while sheet is None or start < len(chunk):
+            if sheet is None or sheet_rows == excel_sheet_rows:
+                sheet = workbook.create_sheet(f"Sheet{len(workbook.worksheets) + 1}")
+                sheet.append([str(col) for col in chunk.columns])
+                sheet_rows = 0
+            part = chunk.iloc[start:start + excel_sheet_rows - sheet_rows]
+            # Missing values become empty cells; categoricals become their labels
+            values = part.astype(object).where(part.notna(), None)
+            for row in values.itertuples(index=False, name=None):
+                sheet.append(row)
+            sheet_rows += len(part)
+            start += len(part)
+    workbook.save(file)
+
+# Function to export chunks (an iterable of frames with the same columns) in one of export_formats.
+# Returns a temporary file rewound to the start; it stays in memory up to spool_max_bytes, then spills to disk.
+def export_file(chunks, fmt):
+    writers = {'CSV': write_csv, 'Parquet': write_parquet, 'Excel': write_excel}
+    file = tempfile.SpooledTemporaryFile(max_size=spool_max_bytes)
+    writers[fmt](chunks, file)
+    file.seek(0)
+    return file
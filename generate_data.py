@@ -0,0 +1,64 @@
+# Synthetic sales data in the dashboard's column layout, for benchmarks and demos:
+#
+#     python generate_data.py sales.csv --rows 1000000 --products 5000
+#
+# Product popularity follows a Zipf-like curve so the ABC classes look like real data.
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from ingest import month_order
+
+# Raw column headers, in the order the dashboard documents them
+csv_columns = ['PRODUCT', 'MONTH', 'PRICE (GHS)', 'QTY SOLD', 'SALES', 'TOTAL STOCK', 'STOCK LEFT(EXCEL)',
+               'ACTUAL STOCK', 'SYSTEM STOCK', 'SURPLUS & SHORTAGE']
+
+# Function to generate rows of sales data in chunks of at most chunk_rows
+def generate_sales(rows, products, months=12, chunk_rows=1_000_000, seed=0):
+    rng = np.random.default_rng(seed)
+    names = np.array([f"Product {i:0{len(str(products))}d}" for i in range(products)], dtype=object)
+    prices = np.round(rng.lognormal(mean=3.5, sigma=0.8, size=products), 2)  # Around GHS 33, long tail
+    popularity = 1 / np.arange(1, products + 1) ** 0.8
+    popularity = rng.permutation(popularity / popularity.sum())
+
+    for start in range(0, rows, chunk_rows):
+        n = min(chunk_rows, rows - start)
+        product = rng.choice(products, size=n, p=popularity)
+        month = rng.integers(0, months, size=n)
+        qty = rng.poisson(5 + 200 * popularity[product] * products / 50)
+        total_stock = qty + rng.integers(0, 100, size=n)
+        actual_stock = total_stock - qty
+        system_stock = actual_stock + rng.integers(-3, 4, size=n)  # Small count discrepancies
+        yield pd.DataFrame({
+            'PRODUCT': names[product],
+            'MONTH': np.array(month_order, dtype=object)[month],
+            'PRICE (GHS)': prices[product],
+            'QTY SOLD': qty,
+            'SALES': np.round(qty * prices[product], 2),
+            'TOTAL STOCK': total_stock,
+            'STOCK LEFT(EXCEL)': actual_stock,
+            'ACTUAL STOCK': actual_stock,
+            'SYSTEM STOCK': system_stock,
+            'SURPLUS & SHORTAGE': actual_stock - system_stock,
+        }, columns=csv_columns)
+
+# Function to write generated sales data to a CSV file, one chunk at a time
+def write_sales_csv(path, rows, products, months=12, chunk_rows=1_000_000, seed=0):
+    for i, chunk in enumerate(generate_sales(rows, products, months, chunk_rows, seed)):
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+
+# Function to parse the command line and write the file
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic sales CSV in the dashboard's column layout.")
+    parser.add_argument('path', help="output CSV file")
+    parser.add_argument('--rows', type=int, default=100_000, help="number of rows (default: 100000)")
+    parser.add_argument('--products', type=int, default=1_000, help="number of distinct products (default: 1000)")
+    parser.add_argument('--months', type=int, default=12, choices=range(1, 13), metavar='1-12',
+                        help="number of months, from January (default: 12)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed (default: 0)")
+    args = parser.parse_args(argv)
+    write_sales_csv(args.path, args.rows, args.products, args.months, seed=args.seed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+import io
+import re
+
+import pandas as pd
+
+# Optional: pyarrow provides a faster, multi-threaded CSV parser and Parquet support
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    csv_engine = 'pyarrow'
+    parquet_available = True
+except ImportError:
+    pa = pa_csv = None
+    csv_engine = 'c'
+    parquet_available = False
+
+# Optional: python-calamine is a native workbook reader for .xlsx and .xlsb; openpyxl only
+# reads .xlsx, and several times slower
+try:
+    import python_calamine  # noqa: F401
+    excel_engine = 'calamine'
+    excel_types = ['xlsx', 'xlsb']
+except ImportError:
+    try:
+        import openpyxl  # noqa: F401
+        excel_engine = 'openpyxl'
+        excel_types = ['xlsx']
+    except ImportError:
+        excel_engine = None
+        excel_types = []
+
+# File types the uploaders accept
+upload_types = ['csv'] + excel_types
+
+# Define the correct order of months
+month_order = ['January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November', 'December']
+
+# Ingestion schema for the expected columns (normalized names).
+# Text columns are read as categoricals, stock counts are downcast to the smallest
+# integer type that fits, and money columns stay float64 so totals keep their cents.
+column_schema = {
+    'PRODUCT': 'category',
+    'MONTH': 'category',
+    'PRICE_(GHS)': 'float64',
+    'QTY_SOLD': 'integer',
+    'SALES': 'float64',
+    'TOTAL_STOCK': 'integer',
+    'STOCK_LEFT(EXCEL)': 'integer',
+    'ACTUAL_STOCK': 'integer',
+    'SYSTEM_STOCK': 'integer',
+    'SURPLUS_&_SHORTAGE': 'integer',
+}
+
+# Function to normalize column names
+def normalize_columns(columns):
+    return pd.Index(columns).str.strip().str.replace(' ', '_').str.upper()
+
+# Function to apply the ingestion schema to a frame with normalized column names
+def apply_schema(df):
+    for col, dtype in column_schema.items():
+        if col not in df.columns:
+            continue
+        if dtype == 'category':
+            if not isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype('category')
+            if '' in df[col].cat.categories:
+                df[col] = df[col].cat.remove_categories([''])  # Treat empty strings as NaN
+        else:
+            values = pd.to_numeric(df[col], errors='coerce')  # Unparseable cells become NaN
+            if dtype == 'integer' and values.notna().all() and (values % 1 == 0).all():
+                values = pd.to_numeric(values.astype('int64'), downcast='integer')
+            df[col] = values
+
+    # Convert MONTH to a categorical type with a specific order
+    if 'MONTH' in df.columns:
+        df['MONTH'] = df['MONTH'].cat.set_categories(month_order, ordered=True)
+    return df
+
+# Function to declare the schema dtypes against the raw column names of a file
+def read_dtypes(file):
+    # Read the header first, then rewind so the file can be parsed from the start
+    file.seek(0)
+    header = pd.read_csv(file, nrows=0).columns
+    file.seek(0)
+    return {raw: 'category' for raw, col in zip(header, normalize_columns(header))
+            if column_schema.get(col) == 'category'}
+
+# Function to read a CSV from a binary file object into a normalized, typed frame. pyarrow reads
+# the text columns as strings (codes such as "00001" keep their zeros, as with the C parser) and
+# infers the others, blank cells becoming missing; apply_schema then converts every column.
+def load_csv(file):
+    text_columns = read_dtypes(file)
+    if csv_engine == 'pyarrow':
+        options = pa_csv.ConvertOptions(column_types={raw: pa.string() for raw in text_columns},
+                                        strings_can_be_null=True)
+        df = pa_csv.read_csv(file, convert_options=options).to_pandas()
+    else:
+        df = pd.read_csv(file, dtype=text_columns)
+    df.columns = normalize_columns(df.columns)  # Normalize column names
+    return apply_schema(df)
+
+# Function to read a CSV from a binary file object in normalized, typed chunks of chunk_rows
+def read_csv_chunks(file, chunk_rows):
+    for chunk in pd.read_csv(file, dtype=read_dtypes(file), chunksize=chunk_rows):
+        chunk.columns = normalize_columns(chunk.columns)  # Normalize column names
+        yield apply_schema(chunk)
+
+# Function to parse raw CSV bytes into a normalized, typed frame
+def parse_csv(data):
+    return load_csv(io.BytesIO(data))
+
+# Function to tell whether a file name is a workbook rather than a CSV file
+def is_excel(name):
+    return str(name).lower().endswith(('.xlsx', '.xlsb'))
+
+# Function to map a sheet name such as "Jan", "JANUARY" or "Sept-2024" to a month, or None
+def sheet_month(sheet):
+    words = re.findall('[a-z]+', str(sheet).lower())
+    if not words or len(words[0]) < 3:
+        return None
+    return next((month for month in month_order if month.lower().startswith(words[0])), None)
+
+# Function to read one sheet of an open workbook into a normalized, typed frame. The sheet name gives
+# the MONTH of rows that have none; sheets that are not months and have no MONTH column are skipped.
+def parse_excel_sheet(book, sheet):
+    month = sheet_month(sheet)
+    df = book.parse(sheet)
+    df.columns = normalize_columns(df.columns.astype(str))
+    df = df.dropna(how='all')  # Blank rows below the table
+    if month is not None:
+        df['MONTH'] = df['MONTH'].fillna(month) if 'MONTH' in df.columns else month
+    elif 'MONTH' not in df.columns:
+        return None
+
+    # Text columns as strings, as the CSV reader gives them (cells may hold numbers)
+    for col in df.columns:
+        if column_schema.get(col) == 'category':
+            df[col] = df[col].map(str, na_action='ignore').astype('category')
+    return apply_schema(df)
+
+# Function to read the sheets of a workbook (raw bytes) as normalized frames, one month sheet at a time.
+# The workbook is opened (unzipped, shared strings read) once and every sheet is parsed from that
+# handle; the readers hold the GIL, so the sheets are parsed in turn rather than in threads.
+def excel_sheets(data):
+    with pd.ExcelFile(io.BytesIO(data), engine=excel_engine) as book:
+        for sheet in book.sheet_names:
+            frame = parse_excel_sheet(book, sheet)
+            if frame is not None:
+                yield frame
+
+# Function to parse the sheets of a workbook (raw bytes) into one normalized frame
+def parse_excel(data):
+    frames = list(excel_sheets(data))
+    if not frames:
+        raise ValueError("no month sheets in the workbook")
+    return combine_frames(frames)
+
+# Function to parse an uploaded file (raw bytes) by its type
+def parse_upload(name, data):
+    return parse_excel(data) if is_excel(name) else parse_csv(data)
+
+# Function to read a CSV or workbook file object in normalized, typed chunks: CSV files by
+# chunk_rows, workbooks one sheet at a time
+def read_upload_chunks(file, chunk_rows):
+    if not is_excel(getattr(file, 'name', '')):
+        yield from read_csv_chunks(file, chunk_rows)
+        return
+    file.seek(0)
+    yield from excel_sheets(file.read())
+
+# Function to merge normalized frames into one, keeping categorical columns categorical
+def combine_frames(frames):
+    frames = list(frames)
+    if len(frames) == 1:
+        return frames[0]
+    for col, dtype in column_schema.items():
+        if dtype != 'category' or col == 'MONTH' or not all(col in frame.columns for frame in frames):
+            continue  # MONTH already shares the month_order categories
+        # Concatenating categoricals only stays categorical when the categories match
+        categories = pd.Index([]).append([frame[col].cat.categories for frame in frames]).unique()
+        for frame in frames:
+            frame[col] = frame[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,141 @@
+# Batch report generation without Streamlit: computes the dashboard's KPIs, aggregates and
+# ABC classes for CSV files or Excel workbooks and writes them to an output directory, one
+# folder per report.
+#
+#     python report.py store_a.csv store_b.csv --out reports/
+#     python report.py january.csv february.csv --combine --name 2024 --format json
+#     python report.py sales/*.parquet --combine --engine duckdb
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from ingest import month_order, parquet_available, is_excel, load_csv, parse_excel, combine_frames
+from analytics import (check_columns, aggregate_rows, finish_aggregates, stream_csv_aggregates, month_matrices, abc_for_months,
+                       summarize_abc, key_metrics, price_sales_bins, price_trend,
+                       summarize_stock, stock_reconciliation,
+                       demand_matrices, forecast_demand)
+from duckdb_engine import duckdb_available, duckdb_aggregates
+
+# Rows per chunk with --stream
+stream_chunk_rows = 500_000
+
+# Function to compute every report table for a set of CSV files or workbooks (merged into one dataset)
+def build_report(paths, stream=False, a_threshold=20, b_threshold=50, months=None, engine='pandas', price_bins='width'):
+    if engine == 'duckdb':
+        if any(is_excel(path) for path in paths):
+            raise ValueError("the duckdb engine reads CSV and Parquet files only")
+        cube, by_product, by_month, price_sales, row_totals = duckdb_aggregates(paths)
+    elif stream:
+        files = [open(path, 'rb') for path in paths]
+        try:
+            cube, by_product, by_month, price_sales, row_totals = stream_csv_aggregates(files, stream_chunk_rows)
+        finally:
+            for file in files:
+                file.close()
+    else:
+        frames = []
+        for path in paths:
+            with open(path, 'rb') as file:
+                frame = parse_excel(file.read()) if is_excel(path) else load_csv(file)
+            check_columns(frame.columns, path)
+            frames.append(frame)
+        cube, by_product, by_month, price_sales, row_totals = finish_aggregates(aggregate_rows(combine_frames(frames)))
+
+    if by_product.empty:
+        raise ValueError(f"no sales rows in {', '.join(map(str, paths))}")
+
+    # Default to every month present in the data, as the dashboard does
+    if months is None:
+        months = by_month.loc[by_month['ROWS'] > 0, 'MONTH'].tolist()
+    abc_data = abc_for_months(month_matrices(cube), months, a_threshold, b_threshold)
+
+    price_bins = price_sales_bins(price_sales, bins=10, method=price_bins)
+    metrics = key_metrics(row_totals, by_month)
+    metrics['price_trend_slope'], metrics['price_trend_intercept'] = price_trend(price_bins)
+    tables = {
+        'cube': cube,
+        'by_product': by_product,
+        'by_month': by_month,
+        'stock_analysis': summarize_stock(by_product),
+        'demand_forecast': forecast_demand(demand_matrices(cube)),
+        'price_bins': price_bins,
+        'abc': abc_data,
+        'abc_summary': summarize_abc(abc_data),
+    }
+    # Only when the data has the system stock and surplus/shortage columns
+    reconciliation = stock_reconciliation(cube)
+    if reconciliation is not None:
+        tables['stock_reconciliation'] = reconciliation
+    return metrics, tables
+
+# Function to write a report's KPIs as JSON and its tables as JSON or Parquet
+def write_report(out_dir, metrics, tables, fmt):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    kpis = {key: value.item() if hasattr(value, 'item') else value for key, value in metrics.items()}
+    with open(out_dir / 'kpis.json', 'w') as file:
+        json.dump(kpis, file, indent=2, default=str)
+
+    for name, table in tables.items():
+        if fmt == 'parquet':
+            table.to_parquet(out_dir / f'{name}.parquet', index=False)
+        else:
+            table.to_json(out_dir / f'{name}.json', orient='records', indent=2)
+
+# Function to build and write one report; runs in a worker process
+def run_report(name, paths, out_root, fmt, stream, a_threshold, b_threshold, months, engine, price_bins):
+    metrics, tables = build_report(paths, stream, a_threshold, b_threshold, months, engine, price_bins)
+    write_report(out_root / name, metrics, tables, fmt)
+    return name
+
+# Function to parse the command line and build the reports, in parallel worker processes
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate sales dashboard reports from CSV files without Streamlit.")
+    parser.add_argument('files', nargs='+', type=Path,
+                        help="CSV files or Excel workbooks (one sheet per month) with the dashboard's column "
+                             "layout, or Parquet files with --engine duckdb")
+    parser.add_argument('--out', type=Path, default=Path('reports'), help="output directory (default: reports)")
+    parser.add_argument('--format', choices=['json', 'parquet'], default='parquet' if parquet_available else 'json',
+                        help="table format (default: parquet when pyarrow is installed, else json)")
+    parser.add_argument('--combine', action='store_true', help="merge all files into a single report")
+    parser.add_argument('--name', default='combined', help="report name with --combine (default: combined)")
+    parser.add_argument('--stream', action='store_true', help="read files in chunks and keep only the aggregates")
+    parser.add_argument('--engine', choices=['pandas', 'duckdb'], default='pandas',
+                        help="aggregation engine; duckdb runs multi-threaded SQL out-of-core (default: pandas)")
+    parser.add_argument('--months', nargs='+', choices=month_order, help="months for the ABC classification")
+    parser.add_argument('--price-bins', choices=['width', 'quantile'], default='width',
+                        help="equal-width or quantile price bins (default: width)")
+    parser.add_argument('--a-threshold', type=float, default=20, help="cumulative sales %% for A items (default: 20)")
+    parser.add_argument('--b-threshold', type=float, default=50, help="cumulative sales %% for B items (default: 50)")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="reports built in parallel")
+    args = parser.parse_args(argv)
+
+    if args.format == 'parquet' and not parquet_available:
+        parser.error("--format parquet requires pyarrow")
+    if args.engine == 'duckdb' and not duckdb_available:
+        parser.error("--engine duckdb requires duckdb")
+
+    if args.combine:
+        jobs = [(args.name, args.files)]
+    else:
+        jobs = [(path.stem, [path]) for path in args.files]
+
+    options = (args.out, args.format, args.stream, args.a_threshold, args.b_threshold, args.months, args.engine,
+               args.price_bins)
+    failed = False
+    with ProcessPoolExecutor(max_workers=max(min(args.jobs, len(jobs)), 1)) as pool:
+        futures = [(name, pool.submit(run_report, name, paths, *options)) for name, paths in jobs]
+        for name, future in futures:
+            try:
+                future.result()
+                print(f"{name}: written to {args.out / name}")
+            except Exception as error:  # One bad file must not abort the other reports
+                failed = True
+                print(f"{name}: failed: {error}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,24 @@
+import io
+
+import ingest
+from analytics import aggregate_rows, finish_aggregates, key_metrics
+
+# One row per kind of problem: a short month name, a lower-case month, a blank product
+odd_rows_csv = (
+    b"PRODUCT,MONTH,PRICE (GHS),QTY SOLD,SALES,TOTAL STOCK,ACTUAL STOCK\n"
+    b"A,January,10,1,10,5,4\n"
+    b"B,Jan,10,2,20,5,4\n"
+    b"C,march,10,3,60,5,4\n"
+    b",February,25,4,100,5,4\n"
+)
+
+def test_key_metrics_cover_rows_outside_cube():
+    df = ingest.load_csv(io.BytesIO(odd_rows_csv))
+    _, by_product, by_month, _, row_totals = finish_aggregates(aggregate_rows(df))
+    metrics = key_metrics(row_totals, by_month)
+    assert metrics['total_sales'] == 190
+    assert metrics['total_units_sold'] == 10
+    assert metrics['total_products'] == 3
+    assert metrics['top_product'] == 'C'
+    assert metrics['rows_outside_cube'] == 3
+    assert by_product['PRODUCT'].tolist() == ['A']
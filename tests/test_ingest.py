@@ -0,0 +1,38 @@
+import io
+
+import pandas as pd
+import pytest
+
+import ingest
+
+# Blank and unparseable cells in text and number columns, and product codes with leading zeros
+blank_cells_csv = (
+    b"PRODUCT,MONTH,PRICE (GHS),QTY SOLD,SALES,TOTAL STOCK,ACTUAL STOCK\n"
+    b"00001,January,1.5,2,3,,4\n"
+    b",February,n.a.,1,2,5,\n"
+    b"00003,March,2,1,2,5,3\n"
+)
+
+# Function to read the test CSV with the in-memory reader and the given parser, and with the streaming reader
+def read_both(monkeypatch, engine):
+    monkeypatch.setattr(ingest, 'csv_engine', engine)
+    loaded = ingest.load_csv(io.BytesIO(blank_cells_csv))
+    streamed = pd.concat(ingest.read_csv_chunks(io.BytesIO(blank_cells_csv), chunk_rows=2), ignore_index=True)
+    return loaded, streamed
+
+@pytest.mark.parametrize('engine', ['pyarrow', 'c'] if ingest.parquet_available else ['c'])
+def test_blank_cells(monkeypatch, engine):
+    loaded, streamed = read_both(monkeypatch, engine)
+    assert loaded['PRODUCT'].tolist()[::2] == ['00001', '00003']
+    assert loaded['PRODUCT'].isna().tolist() == [False, True, False]
+    assert loaded['TOTAL_STOCK'].isna().tolist() == [True, False, False]
+    assert loaded['ACTUAL_STOCK'].isna().tolist() == [False, True, False]
+    assert loaded['PRICE_(GHS)'].isna().tolist() == [False, True, False]
+    assert isinstance(loaded['PRODUCT'].dtype, pd.CategoricalDtype)
+    assert loaded['MONTH'].cat.ordered
+
+@pytest.mark.parametrize('engine', ['pyarrow', 'c'] if ingest.parquet_available else ['c'])
+def test_readers_agree(monkeypatch, engine):
+    loaded, streamed = read_both(monkeypatch, engine)
+    pd.testing.assert_frame_equal(loaded.astype({'PRODUCT': str}), streamed.astype({'PRODUCT': str}),
+                                  check_dtype=False)
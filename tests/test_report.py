@@ -0,0 +1,13 @@
+import report
+
+def test_missing_column_fails_only_its_report(tmp_path, capsys):
+    good = tmp_path / 'good.csv'
+    good.write_text("PRODUCT,MONTH,PRICE (GHS),QTY SOLD,SALES,TOTAL STOCK,ACTUAL STOCK\nA,January,10,1,10,5,4\n")
+    bad = tmp_path / 'bad.csv'
+    bad.write_text("PRODUCT,MONTH,PRICE (GHS),QTY SOLD,TOTAL STOCK,ACTUAL STOCK\nA,January,10,1,5,4\n")
+    status = report.main([str(good), str(bad), '--out', str(tmp_path / 'out'), '--format', 'json', '--jobs', '1'])
+    out, err = capsys.readouterr()
+    assert status == 1
+    assert 'good: written to' in out
+    assert 'bad.csv: missing columns SALES' in err
+    assert (tmp_path / 'out' / 'good').is_dir()